@@ -0,0 +1,7 @@
+"""
+Benchmarks for lanim. They aren't part of the package and aren't installed.
+
+- `benchmarks.render`: end-to-end renders of the bundled examples
+- `benchmarks.scaling`: how combinators and primitives scale with size
+- `benchmarks.latex_stub`: a stand-in for TeX, for machines without it
+"""
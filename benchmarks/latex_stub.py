@@ -0,0 +1,76 @@
+"""
+Stand-in for `pdflatex` and `dvipng`, so that benchmarks can run on
+machines without TeX.
+
+Only the external programs are replaced: the LaTeX document is still
+written, the resulting image still goes through the on-disk cache, and the
+compilation takes a configurable amount of time, so cold and warm caches
+behave like the real thing.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import re
+import shutil
+import time
+from typing import Iterator
+
+from PIL import Image, ImageDraw
+
+from lanim import latex
+
+
+DEFAULT_DELAY = 0.4
+"Roughly how long `pdflatex` and `dvipng` take for a small formula, in seconds"
+
+
+def fake_latex_image(source: str, dpi: int) -> Image.Image:
+    """
+    White blocks on a transparent background, about as big as
+    the typeset `source` would be
+    """
+    lines = [line for line in re.split(r"\\\\|\n", source) if line.strip()] or [""]
+    char_width = max(1, round(dpi * 0.07))
+    line_height = max(1, round(dpi * 0.16))
+    width = char_width * max(2, max(len(line.strip()) for line in lines))
+    img = Image.new("RGBA", (width, line_height * len(lines)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for (row, line) in enumerate(lines):
+        for (column, char) in enumerate(line.strip()):
+            if not char.isspace():
+                draw.rectangle(
+                    (
+                        column * char_width + 1, row * line_height + line_height // 4,
+                        (column + 1) * char_width - 2, (row + 1) * line_height - line_height // 4,
+                    ),
+                    fill=(255, 255, 255, 255),
+                )
+    return img
+
+
+@contextmanager
+def stub_latex(delay: float = DEFAULT_DELAY) -> Iterator[None]:
+    """
+    Replace the TeX programs with `fake_latex_image` while the block runs
+    """
+    original_run = latex.run_latex_process
+
+    def run_latex_process(input_file: Path, output_dir: Path, dpi: int = latex.DEFAULT_DPI) -> Path:
+        time.sleep(delay)
+        document = input_file.read_text("utf-8")
+        source = document.split(r"\begin{document}", 1)[1].rsplit(r"\end{document}", 1)[0]
+        output_png_file = output_dir / "output.png"
+        fake_latex_image(source.strip(), dpi).save(output_png_file)
+        return output_png_file
+
+    latex.run_latex_process = run_latex_process
+    try:
+        yield
+    finally:
+        latex.run_latex_process = original_run
+
+
+def tex_available() -> bool:
+    return all(shutil.which(program) for program in ("pdflatex", "dvipng"))
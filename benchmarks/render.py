@@ -0,0 +1,342 @@
+"""
+End-to-end benchmark: render the bundled examples and record how long
+each stage takes.
+
+Usage:
+```
+python -m benchmarks.render run -o before.json
+git checkout my-branch
+python -m benchmarks.render run -o after.json
+python -m benchmarks.render compare before.json after.json
+```
+
+Every combination of example, resolution, frame rate, thread count and
+entry point (`render_pil` or the command-line `entry_point`) is rendered
+twice, each time in a fresh process inside its own scratch directory:
+
+- `cold`: the LaTeX cache is empty
+- `warm`: the LaTeX cache on disk is filled by the cold run
+
+If `pdflatex` or `dvipng` are missing (or with `--stub-latex always`), TeX
+is replaced with `benchmarks.latex_stub`. `entry_point` runs need `ffmpeg`
+and are skipped without it.
+
+`compare` exits with status 1 if any timing got worse than the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+import itertools
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Iterator, Optional
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+RESULT_MARKER = "BENCHMARK-RESULT "
+
+EXAMPLES = ("hello", "showcase", "hadoukenify")
+
+
+@dataclass(frozen=True)
+class Case:
+    """
+    A single configuration to render
+    """
+    example: str
+    width: int
+    height: int
+    fps: int
+    workers: int
+    entry: str
+    "`render_pil` or `entry_point`"
+
+    max_frames: Optional[int] = None
+    "Only render this many frames from the start, to keep long examples short"
+
+    def key(self) -> str:
+        return f"{self.example} {self.width}x{self.height}@{self.fps} t{self.workers} {self.entry}"
+
+
+# Running a single case (in a child process):
+
+def _peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _run_case(case: Case, stub: bool, latex_delay: float, spawned_at: float) -> dict[str, Any]:
+    from benchmarks.latex_stub import stub_latex
+    from lanim import latex, standalone
+    from lanim.core import frame_count
+    from lanim.pil_machinery import render_pil
+    from lanim.pipeline import StageStats
+
+    latex_calls = 0
+    latex_time = 0.0
+    stats: list[StageStats] = []
+    first_frame: Optional[float] = None
+
+    def progress(_: int):
+        nonlocal first_frame
+        if first_frame is None:
+            # since the process was started, so that imports are included
+            first_frame = time.time() - spawned_at
+
+    with stub_latex(latex_delay) if stub else nullcontext():
+        original_run = latex.run_latex_process
+        def timed_run(*args: Any, **kwargs: Any) -> Path:
+            nonlocal latex_calls, latex_time
+            t1 = time.perf_counter()
+            try:
+                return original_run(*args, **kwargs)
+            finally:
+                latex_calls += 1
+                latex_time += time.perf_counter() - t1
+        latex.run_latex_process = timed_run
+
+        t1 = time.perf_counter()
+        if case.entry == "render_pil":
+            animation = standalone._find_animation(f"lanim.examples.{case.example}", "export")
+            total = frame_count(animation, case.fps)
+            render_pil(
+                case.width, case.height, animation, Path(".lanim"), case.fps, case.workers,
+                frame_numbers=range(min(total, case.max_frames or total)),
+                stats=stats,
+                progress=progress,
+            )
+        elif case.entry == "entry_point":
+            def collecting_render_pil(*args: Any, **kwargs: Any) -> float:
+                return render_pil(*args, **kwargs, stats=stats, progress=progress)
+            standalone.render_pil = collecting_render_pil  # type: ignore
+            standalone.entry_point(argparse.Namespace(  # type: ignore
+                module=f"lanim.examples.{case.example}",
+                export_name="export",
+                width=case.width,
+                height=case.height,
+                fps=case.fps,
+                temp_dir=Path(".lanim"),
+                output=Path("output.mp4"),
+                threads=case.workers,
+                processes=0,
+                range=(0, 99),
+                shard=None,
+                frames=None if case.max_frames is None else (0, case.max_frames),
+                farm=None,
+                farm_workers=0,
+                draft=None,
+                time_budget=None,
+                mono=False,
+                also=[],
+                resize_variants=False,
+                watch=False,
+                still=None,
+                contact_sheet=None,
+            ))
+        else:
+            raise ValueError(f"Unknown entry point {case.entry!r}")
+        seconds = time.perf_counter() - t1
+
+    frames = stats[-1].items if stats else 0
+    return {
+        "seconds": seconds,
+        "first_frame": first_frame,
+        "frames": frames,
+        "frames_per_second": frames / seconds if seconds else 0.0,
+        "stages": {stage.name: stage.busy for stage in stats},
+        "latex": latex_time,
+        "latex_compiles": latex_calls,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+# Running the whole suite:
+
+def _spawn_case(case: Case, workdir: Path, stub: bool, latex_delay: float) -> dict[str, Any]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    spec = json.dumps({"case": asdict(case), "stub": stub, "latex_delay": latex_delay, "spawned_at": time.time()})
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.render", "_case", spec],
+        cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{case.key()} failed:\n{proc.stdout}")
+
+
+def _cases(args: argparse.Namespace) -> Iterator[Case]:
+    for (example, size, fps, workers, entry) in itertools.product(
+        args.examples, args.sizes, args.fps, args.workers, args.entry
+    ):
+        width, height = size
+        yield Case(example, width, height, fps, workers, entry, args.max_frames)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        proc = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+    except FileNotFoundError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def run_suite(args: argparse.Namespace) -> dict[str, Any]:
+    from benchmarks.latex_stub import tex_available
+
+    stub = args.stub_latex == "always" or (args.stub_latex == "auto" and not tex_available())
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+
+    results: list[dict[str, Any]] = []
+    for case in _cases(args):
+        if case.entry == "entry_point" and not has_ffmpeg:
+            print(f"{case.key()}: skipped, ffmpeg is not installed")
+            continue
+        with tempfile.TemporaryDirectory(prefix="lanim-bench-") as workdir:
+            for cache in ("cold", "warm"):
+                result = _spawn_case(case, Path(workdir), stub, args.latex_delay)
+                print(
+                    f"{case.key()} [{cache}]: {result['seconds']:.2f}s, "
+                    f"{result['frames_per_second']:.1f} frames/s, "
+                    f"first frame after {result['first_frame'] or 0:.2f}s, "
+                    f"LaTeX {result['latex']:.2f}s, peak RSS {result['peak_rss_kb']} KiB"
+                )
+                results.append({"key": case.key(), "cache": cache, "case": asdict(case), **result})
+
+    return {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latex": "stub" if stub else "tex",
+        "results": results,
+    }
+
+
+# Comparing two runs:
+
+def _metrics(result: dict[str, Any]) -> dict[str, float]:
+    """
+    Timings where a larger value is worse
+    """
+    metrics = {"total": result["seconds"], "latex": result["latex"]}
+    if result.get("first_frame") is not None:
+        metrics["first frame"] = result["first_frame"]
+    for (name, busy) in result["stages"].items():
+        metrics[name] = busy
+    return metrics
+
+
+def compare(old: dict[str, Any], new: dict[str, Any], threshold: float, min_seconds: float) -> list[str]:
+    """
+    Print a table of changes between two runs and return the regressions
+    """
+    old_results = {(r["key"], r["cache"]): r for r in old["results"]}
+    regressions: list[str] = []
+    print(f"Comparing {old.get('revision')} with {new.get('revision')}")
+    for result in new["results"]:
+        ident = (result["key"], result["cache"])
+        before = old_results.get(ident)
+        if before is None:
+            print(f"{ident[0]} [{ident[1]}]: new")
+            continue
+        old_metrics = _metrics(before)
+        for (name, value) in _metrics(result).items():
+            if name not in old_metrics:
+                continue
+            previous = old_metrics[name]
+            change = (value - previous) / previous if previous else 0.0
+            worse = value - previous > min_seconds and change > threshold
+            line = (
+                f"{ident[0]} [{ident[1]}] {name}: {previous:.3f}s -> {value:.3f}s "
+                f"({change:+.1%}){'  REGRESSION' if worse else ''}"
+            )
+            print(line)
+            if worse:
+                regressions.append(line)
+        if before["peak_rss_kb"] and result["peak_rss_kb"]:
+            change = (result["peak_rss_kb"] - before["peak_rss_kb"]) / before["peak_rss_kb"]
+            worse = change > threshold
+            line = (
+                f"{ident[0]} [{ident[1]}] peak RSS: {before['peak_rss_kb']} -> "
+                f"{result['peak_rss_kb']} KiB ({change:+.1%}){'  REGRESSION' if worse else ''}"
+            )
+            print(line)
+            if worse:
+                regressions.append(line)
+    return regressions
+
+
+# Command line:
+
+def _parse_size(s: str) -> tuple[int, int]:
+    width, height = map(int, s.split("x"))
+    return (width, height)
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.render", description="End-to-end render benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmarks")
+    run.add_argument("-o", "--output", metavar="PATH", type=Path, help="Where to save the results as JSON")
+    run.add_argument("--examples", nargs="+", choices=EXAMPLES, default=list(EXAMPLES))
+    run.add_argument("--sizes", nargs="+", metavar="WxH", type=_parse_size, default=[(320, 180), (1280, 720)])
+    run.add_argument("--fps", nargs="+", type=int, default=[15])
+    run.add_argument("--workers", nargs="+", type=int, default=[1, os.cpu_count() or 1])
+    run.add_argument("--entry", nargs="+", choices=("render_pil", "entry_point"), default=["render_pil", "entry_point"])
+    run.add_argument("--max-frames", type=int, default=90, help="Render at most this many frames of each example")
+    run.add_argument("--stub-latex", choices=("auto", "always", "never"), default="auto")
+    run.add_argument("--latex-delay", type=float, default=0.4, help="How long a stubbed LaTeX compilation takes")
+
+    cmp = commands.add_parser("compare", help="Compare two result files")
+    cmp.add_argument("old", type=Path)
+    cmp.add_argument("new", type=Path)
+    cmp.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown to report, 0.1 is 10%%")
+    cmp.add_argument("--min-seconds", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+
+    case = commands.add_parser("_case")
+    case.add_argument("spec")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "_case":
+        spec = json.loads(args.spec)
+        sys.path.insert(0, os.getcwd())
+        result = _run_case(Case(**spec["case"]), spec["stub"], spec["latex_delay"], spec["spawned_at"])
+        print(RESULT_MARKER + json.dumps(result))
+    elif args.command == "run":
+        report = run_suite(args)
+        if args.output is not None:
+            args.output.write_text(json.dumps(report, indent=2), "utf-8")
+    else:
+        old = json.loads(args.old.read_text("utf-8"))
+        new = json.loads(args.new.read_text("utf-8"))
+        regressions = compare(old, new, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} regressions:")
+            for line in regressions:
+                print(line)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Micro-benchmarks measuring how combinators and primitives scale with size.
+
+Usage:
+```
+python -m benchmarks.scaling
+python -m benchmarks.scaling --max-n 100000 --only seq_a swap -o scaling.json
+python -m benchmarks.scaling --check
+```
+
+Each benchmark builds a synthetic workload of size N (items in a group,
+segments in a timeline, ...) for N = 10, 100, 1000, ... and times it. The
+growth exponent `k` in `time ~ N^k` is estimated from the largest sizes and
+compared with the exponent the benchmark is expected to have, so hidden
+quadratic behaviour stands out. With `--check`, the command exits with
+status 1 if any benchmark grows faster than expected.
+
+With `--memory`, the memory benchmarks run instead: they build scenes of
+N = `--max-n` nodes under `tracemalloc` and report the bytes and memory
+blocks each node keeps alive, and the peak memory per node while building.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+import gc
+import json
+import math
+from pathlib import Path
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Optional, Sequence
+
+
+Workload = Callable[[], Any]
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """
+    A family of workloads of increasing size
+    """
+    name: str
+    setup: Callable[[int], Workload]
+    "Prepare a workload of size N. Only calling the workload is timed."
+
+    expected: float = 1.0
+    "Expected exponent: 1 for linear, 0 for constant, etc."
+
+    max_n: Optional[int] = None
+    "The largest sensible N, for example because of the recursion limit"
+
+
+@dataclass(frozen=True)
+class MemoryBenchmark:
+    """
+    A workload whose result is measured, rather than its speed
+    """
+    name: str
+    setup: Callable[[int], Workload]
+    "Prepare a workload building N nodes. Only what the workload allocates is counted."
+
+
+# Synthetic scenes:
+
+def _rects(n: int):
+    from lanim.pil_types import Rect
+    return [Rect(i % 100 * 0.1 - 5, i // 100 * 0.1 - 3, 0.05, 0.05) for i in range(n)]
+
+
+def _samples(animation: Any, count: int) -> Workload:
+    """
+    Evaluate an animation at `count` evenly spaced moments
+    """
+    projector = animation.projector
+    ts = [i / max(1, count - 1) for i in range(count)]
+    return lambda: [projector(t) for t in ts]
+
+
+# Workloads:
+
+def _seq_a(n: int) -> Workload:
+    from lanim.core import const_a, seq_a
+    # a timeline with n segments, evaluated once per segment
+    return _samples(seq_a(*(const_a(i) for i in range(n))), n)
+
+
+def _flatmap_a(n: int) -> Workload:
+    from lanim.core import const_a, flatmap_a
+    return _samples(flatmap_a(range(n), lambda a: [const_a(a)]), n)
+
+
+def _par_a_longest(n: int) -> Workload:
+    from lanim.core import const_a, par_a_longest
+    # a balanced tree of n animations, evaluated a few times
+    layer = [const_a(i) * (1 + i % 3) for i in range(n)]
+    while len(layer) > 1:
+        layer = [
+            par_a_longest(layer[i], layer[i + 1]) if i + 1 < len(layer) else layer[i]
+            for i in range(0, len(layer), 2)
+        ]
+    return _samples(layer[0], 10)
+
+
+def _parallel(n: int) -> Workload:
+    from lanim.core import const_a
+    from lanim.pil_graphics import parallel
+    from lanim.pil_types import Rect
+    return _samples(parallel(*(const_a(Rect(0, 0, 1, 1)) * (1 + i % 3) for i in range(n))), 10)
+
+
+def _map_chain(n: int) -> Workload:
+    from lanim.core import const_a
+    from lanim.easings import in_out
+    animation = const_a(0.0)
+    for i in range(n):
+        animation = animation.map(lambda x: x + 1) if i % 2 else animation.ease(in_out)
+    return _samples(animation, 10)
+
+
+def _group_moved(n: int) -> Workload:
+    from lanim.pil_types import Group
+    group = Group(_rects(n))
+    return lambda: group.moved(1, 1)
+
+
+def _group_scaled(n: int) -> Workload:
+    from lanim.pil_types import Group
+    group = Group(_rects(n))
+    return lambda: group.scaled(2)
+
+
+def _group_morphed(n: int) -> Workload:
+    from lanim.pil_types import Group
+    a = Group(_rects(n))
+    b = a.moved(1, 1)
+    return lambda: a.morphed(b, 0.5)
+
+
+def _group_add(n: int) -> Workload:
+    from lanim.pil_types import Group, Rect
+    rects = _rects(n)
+    def add_all():
+        group = Group([Rect(0, 0, 1, 1)])
+        for rect in rects:
+            group = group.add(rect)
+        return group
+    return add_all
+
+
+def _rect_list(n: int) -> Workload:
+    return lambda: _rects(n)
+
+
+def _nested_groups(n: int) -> Workload:
+    from lanim.pil_types import Group, Opacity, Pair
+    def build():
+        rects = _rects(n)
+        # pairs of faded rectangles in groups of ten
+        return Group([
+            Group([Pair(Opacity(a, 0.5), b) for (a, b) in zip(rects[i:i + 20:2], rects[i + 1:i + 20:2])])
+            for i in range(0, n, 20)
+        ])
+    return build
+
+
+def _swap(n: int) -> Workload:
+    from lanim.pil_graphics import swap
+    from lanim.pil_types import Group
+    group = Group(_rects(n))
+    return lambda: _samples(swap(group, 0, n - 1), 10)()
+
+
+def _threaded_cache(n: int) -> Workload:
+    from lanim.threaded_cache import ThreadedCache
+    def run():
+        cache = ThreadedCache(lambda k: k * 2)
+        def hammer(offset: int):
+            for i in range(n):
+                cache[(i + offset) % 64]
+        threads = [threading.Thread(target=hammer, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return run
+
+
+def _draw_rectangles(n: int) -> Workload:
+    from lanim.pil_machinery import default_settings
+    from lanim.pil_types import Style
+    ctx = default_settings(640, 360).make_ctx()
+    style = Style(fill=None, outline=0xffffff, line_width=2)
+    def run():
+        for i in range(n):
+            ctx.rectangle_wh(i % 100 * 0.1 - 5, i // 100 % 60 * 0.1 - 3, 0.5, 0.5, style)
+    return run
+
+
+def _draw_group(n: int) -> Workload:
+    from lanim.pil_machinery import default_settings
+    from lanim.pil_types import Group
+    ctx = default_settings(640, 360).make_ctx()
+    group = Group(_rects(n))
+    return lambda: group.render_pil(ctx)
+
+
+BENCHMARKS = [
+    Benchmark("seq_a", _seq_a),
+    Benchmark("flatmap_a", _flatmap_a),
+    Benchmark("par_a_longest", _par_a_longest),
+    Benchmark("parallel", _parallel),
+    Benchmark("ease/map chain", _map_chain, max_n=1000),
+    Benchmark("Group.moved", _group_moved),
+    Benchmark("Group.scaled", _group_scaled),
+    Benchmark("Group.morphed", _group_morphed),
+    # each add goes down the rope, so adding N items is O(N log N),
+    # which looks like N^1.1-1.3 at these sizes
+    Benchmark("Group.add", _group_add, expected=1.2),
+    Benchmark("swap", _swap),
+    Benchmark("ThreadedCache", _threaded_cache),
+    Benchmark("PilContext.rectangle_wh", _draw_rectangles),
+    Benchmark("Group.render_pil", _draw_group),
+]
+
+
+MEMORY_BENCHMARKS = [
+    MemoryBenchmark("Rect", _rect_list),
+    MemoryBenchmark("Group of Pair/Opacity", _nested_groups),
+    MemoryBenchmark("Group.moved", _group_moved),
+    MemoryBenchmark("Group.morphed", _group_morphed),
+    MemoryBenchmark("Group.add", _group_add),
+]
+
+
+# Measuring:
+
+def measure(workload: Workload, repeat: int, min_time: float = 0.02) -> float:
+    """
+    Best time of a single call out of `repeat` rounds. Fast workloads are
+    called several times per round, so the timer's resolution doesn't matter.
+    """
+    t1 = time.perf_counter()
+    workload()
+    once = time.perf_counter() - t1
+    number = max(1, math.ceil(min_time / once)) if once < min_time else 1
+    best = once
+    if once > 1.0:
+        return best  # slow enough to be measured precisely the first time
+    for _ in range(repeat):
+        t1 = time.perf_counter()
+        for _ in range(number):
+            workload()
+        best = min(best, (time.perf_counter() - t1) / number)
+    return best
+
+
+def measure_memory(workload: Workload, n: int) -> dict[str, float]:
+    """
+    Bytes and memory blocks kept alive by the result of the workload,
+    and the peak memory while running it, all divided by `n`
+    """
+    workload()  # so that imports and caches aren't counted
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        result = workload()
+        (_, peak) = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    del result
+    return {
+        "bytes_per_node": sum(stat.size_diff for stat in stats) / n,
+        "blocks_per_node": sum(stat.count_diff for stat in stats) / n,
+        "peak_bytes_per_node": peak / n,
+    }
+
+
+def growth_exponent(points: Sequence[tuple[int, float]], last: int = 3) -> Optional[float]:
+    """
+    Slope of the least-squares line through the last few points on a log-log scale
+    """
+    points = [(n, t) for (n, t) in points if t > 0][-last:]
+    if len(points) < 2:
+        return None
+    xs = [math.log(n) for (n, _) in points]
+    ys = [math.log(t) for (_, t) in points]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    sxx = sum((x - mx) ** 2 for x in xs)
+    return sum((x - mx) * (y - my) for (x, y) in zip(xs, ys)) / sxx
+
+
+def ascii_plot(points: Sequence[tuple[int, float]], expected: float, width: int = 48, height: int = 10) -> str:
+    """
+    Log-log plot of the measurements (`*`) against the expected growth
+    starting from the first measurement (`.`)
+    """
+    (n0, t0) = points[0]
+    reference = [(n, t0 * (n / n0) ** expected) for (n, _) in points]
+    all_points = [*points, *reference]
+    x_lo, x_hi = math.log(min(n for (n, _) in all_points)), math.log(max(n for (n, _) in all_points))
+    y_lo, y_hi = math.log(min(t for (_, t) in all_points)), math.log(max(t for (_, t) in all_points))
+
+    def cell(n: float, t: float) -> tuple[int, int]:
+        column = round((math.log(n) - x_lo) / ((x_hi - x_lo) or 1) * (width - 1))
+        row = round((math.log(t) - y_lo) / ((y_hi - y_lo) or 1) * (height - 1))
+        return (height - 1 - row, column)
+
+    grid = [[" "] * width for _ in range(height)]
+    for (n, t) in reference:
+        row, column = cell(n, t)
+        grid[row][column] = "."
+    for (n, t) in points:
+        row, column = cell(n, t)
+        grid[row][column] = "*"
+
+    top = f"{math.exp(y_hi):.2e}s"
+    bottom = f"{math.exp(y_lo):.2e}s"
+    margin = max(len(top), len(bottom))
+    lines = [
+        (top if i == 0 else bottom if i == height - 1 else "").rjust(margin) + " |" + "".join(row)
+        for (i, row) in enumerate(grid)
+    ]
+    lines.append(" " * margin + " +" + "-" * width)
+    left = f"N={points[0][0]}"
+    right = f"N={points[-1][0]}"
+    lines.append(" " * (margin + 2) + left + right.rjust(width - len(left)))
+    return "\n".join(lines)
+
+
+def run_benchmark(benchmark: Benchmark, sizes: Sequence[int], repeat: int, time_limit: float) -> dict[str, Any]:
+    """
+    Measure the benchmark for each size, stopping early when a single
+    call would take longer than `time_limit` seconds
+    """
+    points: list[tuple[int, float]] = []
+    for n in sizes:
+        if benchmark.max_n is not None and n > benchmark.max_n:
+            break
+        if points:
+            (last_n, last_t) = points[-1]
+            exponent = max(benchmark.expected, growth_exponent(points, last=2) or 0.0)
+            if last_t * (n / last_n) ** exponent > time_limit:
+                break
+        points.append((n, measure(benchmark.setup(n), repeat)))
+    exponent = growth_exponent(points)
+    return {
+        "name": benchmark.name,
+        "expected": benchmark.expected,
+        "exponent": exponent,
+        "points": points,
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.scaling", description="Scaling micro-benchmarks")
+    parser.add_argument("--min-n", type=int, default=10)
+    parser.add_argument("--max-n", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3, help="Take the best of this many rounds")
+    parser.add_argument("--time-limit", type=float, default=2.0, help="Don't try larger sizes once a call takes this long")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Only run these benchmarks")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="How much faster than expected growth is allowed")
+    parser.add_argument("--no-plots", action="store_true", help="Only print the table")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if anything grows faster than expected")
+    parser.add_argument("--memory", action="store_true", help="Measure memory per node at N = --max-n instead of time")
+    parser.add_argument("-o", "--output", metavar="PATH", type=Path, help="Where to save the results as JSON")
+    args = parser.parse_args(argv)
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20_000))
+
+    sizes = []
+    n = args.min_n
+    while n <= args.max_n:
+        sizes.append(n)
+        n *= 10
+
+    if args.memory:
+        memory_results = []
+        for memory_benchmark in MEMORY_BENCHMARKS:
+            if args.only is not None and memory_benchmark.name not in args.only:
+                continue
+            memory = measure_memory(memory_benchmark.setup(args.max_n), args.max_n)
+            memory_results.append({"name": memory_benchmark.name, "n": args.max_n, **memory})
+            print(
+                f"{memory_benchmark.name}: {memory['bytes_per_node']:.0f} bytes, "
+                f"{memory['blocks_per_node']:.2f} blocks per node, "
+                f"peak {memory['peak_bytes_per_node']:.0f} bytes per node"
+            )
+        if args.output is not None:
+            args.output.write_text(json.dumps(memory_results, indent=2), "utf-8")
+        return
+
+    benchmarks = [b for b in BENCHMARKS if args.only is None or b.name in args.only]
+    results = []
+    suspicious = []
+    for benchmark in benchmarks:
+        result = run_benchmark(benchmark, sizes, args.repeat, args.time_limit)
+        results.append(result)
+        exponent = result["exponent"]
+        flag = exponent is not None and exponent > benchmark.expected + args.tolerance
+        if flag:
+            suspicious.append(benchmark.name)
+        times = ", ".join(f"N={n}: {t * 1000:.3g}ms" for (n, t) in result["points"])
+        shown = "?" if exponent is None else f"{exponent:.2f}"
+        print(f"{benchmark.name}: N^{shown} (expected N^{benchmark.expected:g}){'  SUSPICIOUS' if flag else ''}")
+        print(f"  {times}")
+        if not args.no_plots and len(result["points"]) >= 2:
+            print(ascii_plot(result["points"], benchmark.expected))
+        print()
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), "utf-8")
+
+    if suspicious:
+        print("Growing faster than expected: " + ", ".join(suspicious))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,6 @@ import argparse
 import multiprocessing
 import pathlib
 
-from lanim.standalone import entry_point
-
 
 # -h conflicts with our `height` option, so we need to change it
 parser = argparse.ArgumentParser(add_help=False)
@@ -33,6 +31,16 @@ parser.add_argument(
     help="Number of threads do launch. Defaults to CPU count ({} in your case)".format(cpu_count),
     default=cpu_count
 )
+parser.add_argument(
+    "--processes",
+    metavar="COUNT",
+    type=int,
+    help="Draw frames in COUNT processes instead of threads, sharing the frames "
+         "with the main process through shared memory. Only works on systems "
+         "with `fork`, like Linux and macOS. --threads is then the number of "
+         "threads compressing the frames.",
+    default=0
+)
 parser.add_argument(
     "-p", "--temp-dir",
     metavar="PATH",
@@ -62,7 +70,26 @@ def _parse_range(s: str) -> tuple[int, int]:
     return (from_, to)
 
 
-parser.add_argument(
+def _parse_shard(s: str) -> tuple[int, int]:
+    shard, shards = map(int, s.split("/"))
+    if shards < 1:
+        raise ValueError("in K/N, N should be positive, got {}".format(shards))
+    if not (1 <= shard <= shards):
+        raise ValueError("in K/N, K should be from 1 to N, got {}".format(shard))
+    return (shard, shards)
+
+
+def _parse_frames(s: str) -> tuple[int, int]:
+    start, stop = map(int, s.split(":"))
+    if start < 0:
+        raise ValueError("in FROM:TO, FROM should be positive, got {}".format(start))
+    if stop <= start:
+        raise ValueError("in FROM:TO, TO should be greater than FROM")
+    return (start, stop)
+
+
+selection = parser.add_mutually_exclusive_group()
+selection.add_argument(
     "--range",
     metavar="PERCENT:PERCENT",
     help="What range of the animation to render, for example `--range 25:49` "
@@ -70,9 +97,128 @@ parser.add_argument(
     default=(0, 99),
     type=_parse_range
 )
+selection.add_argument(
+    "--shard",
+    metavar="K/N",
+    help="Split the frames into N equal pieces and only render the K-th one, "
+         "for example `--shard 2/4`. Use `python -m lanim.merge` to combine the pieces.",
+    default=None,
+    type=_parse_shard
+)
+selection.add_argument(
+    "--frames",
+    metavar="FROM:TO",
+    help="Only render frames from FROM up to, but not including, TO. "
+         "Use `python -m lanim.merge` to combine the pieces.",
+    default=None,
+    type=_parse_frames
+)
+
+parser.add_argument(
+    "--farm",
+    metavar="ADDRESS",
+    help="Don't render the frames here, but hand them out to workers "
+         "started with `python -m lanim.farm ADDRESS`. ADDRESS is HOST:PORT "
+         "or a path to a Unix socket.",
+    default=None,
+)
+parser.add_argument(
+    "--farm-workers",
+    metavar="COUNT",
+    type=int,
+    help="Number of workers to start on this machine when using --farm. "
+         "Each of them uses --threads threads.",
+    default=0,
+)
+
+parser.add_argument(
+    "--draft",
+    metavar="FACTOR",
+    type=float,
+    nargs="?",
+    const=0.25,
+    help="Quick preview: scale the resolution and the frame rate by FACTOR "
+         "(0.25 by default), render LaTeX at a low resolution and fade "
+         "semi-transparent objects with a plain alpha.",
+    default=None,
+)
+parser.add_argument(
+    "--time-budget",
+    metavar="SECONDS",
+    type=float,
+    help="Stop rendering after SECONDS and only output the frames rendered so far",
+    default=None,
+)
+parser.add_argument(
+    "--mono",
+    action="store_true",
+    help="Render 8-bit grayscale frames. This is faster and uses less memory, "
+         "and is enough for white-on-black scenes.",
+)
+
+
+
+def _parse_variant(s: str) -> tuple[int, int, pathlib.Path]:
+    size, _, path = s.partition(":")
+    if not path:
+        raise ValueError("expected WIDTHxHEIGHT:PATH, got {!r}".format(s))
+    width, height = map(int, size.split("x"))
+    if width < 1 or height < 1:
+        raise ValueError("in WIDTHxHEIGHT:PATH, the size should be positive, got {}".format(size))
+    return (width, height, pathlib.Path(path))
+
+
+parser.add_argument(
+    "--also",
+    metavar="WIDTHxHEIGHT:PATH",
+    action="append",
+    type=_parse_variant,
+    help="Also render the animation at another size into PATH, in the same pass, "
+         "for example `--also 1280x720:video_720p.mp4 --also 320x180:thumbnail.gif`. "
+         "Can be repeated.",
+    default=[],
+)
+parser.add_argument(
+    "--resize-variants",
+    action="store_true",
+    help="Make the --also outputs by resizing the main frames instead of drawing "
+         "the scene at each size. Faster, but blurrier.",
+)
+
+parser.add_argument(
+    "--watch",
+    action="store_true",
+    help="After rendering, keep running and update the output whenever the "
+         "scene's source files change, re-rendering only the frames whose scene "
+         "trees changed. Functions in the trees are compared by their code and "
+         "captured variables.",
+)
+
+stills = parser.add_mutually_exclusive_group()
+stills.add_argument(
+    "--still",
+    metavar="SECONDS",
+    type=float,
+    help="Don't render a video, only save the frame at SECONDS from the start "
+         "as an image, for example `--still 12.5 -o frame.png`.",
+    default=None,
+)
+stills.add_argument(
+    "--contact-sheet",
+    metavar="COUNT",
+    type=int,
+    help="Don't render a video, only save an image with COUNT evenly spaced "
+         "frames laid out in a grid.",
+    default=None,
+)
 
 
 args = parser.parse_args()
 print(args)
+
+# imported after parsing the arguments, so that `--help` and mistakes
+# in the arguments don't wait for PIL and the rest of lanim to load
+from lanim.standalone import entry_point
+
 entry_point(args)  # type: ignore
 
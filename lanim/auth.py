@@ -0,0 +1,72 @@
+"""
+Keys for the connections between lanim processes, like the render farm and
+the render daemon.
+
+Their messages are pickled, so anyone who knows the key can run code on the
+other side. The key is read from the `LANIM_FARM_KEY` environment variable,
+which should be the same for all processes that talk to each other.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import os
+import secrets
+import socket
+from typing import Union
+
+
+__all__ = [
+    "Address",
+    "authkey",
+    "is_local",
+    "listener_authkey",
+]
+
+
+Address = Union[str, tuple[str, int]]
+"`(HOST, PORT)` for TCP or a path to a Unix socket"
+
+KEY_VARIABLE = "LANIM_FARM_KEY"
+
+
+def authkey() -> bytes:
+    """
+    The key from the environment, raising `RuntimeError` if it isn't set
+    """
+    key = os.environ.get(KEY_VARIABLE)
+    if not key:
+        raise RuntimeError("Set the {} environment variable to the shared key".format(KEY_VARIABLE))
+    return key.encode()
+
+
+def is_local(address: Address) -> bool:
+    """
+    Whether only this machine can connect to `address`:
+    a Unix socket or a loopback address
+    """
+    if isinstance(address, str):
+        return True
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(address[0])).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def listener_authkey(address: Address) -> bytes:
+    """
+    The key to accept connections at `address` with. If it isn't set, a
+    random key is made up for local addresses and put into the environment,
+    so that the processes started from here inherit it. Other addresses
+    raise `RuntimeError` instead.
+    """
+    if not os.environ.get(KEY_VARIABLE):
+        if not is_local(address):
+            raise RuntimeError(
+                "Listening on {!r} needs the {} environment variable to be set: "
+                "without it, anyone who can connect could run code on this machine"
+                .format(address, KEY_VARIABLE)
+            )
+        os.environ[KEY_VARIABLE] = secrets.token_urlsafe(32)
+        print("Generated {}={}".format(KEY_VARIABLE, os.environ[KEY_VARIABLE]))
+    return authkey()
@@ -0,0 +1,315 @@
+"""
+Render many animations in a single process.
+
+Usage:
+```
+python -m lanim.batch jobs.json
+```
+
+Starting lanim once per animation means importing everything, checking
+the dependencies and warming up the LaTeX cache over and over. A batch
+does it once for a whole list of jobs, described by a JSON manifest:
+
+```json
+{
+    "defaults": {"width": 640, "height": 360, "fps": 15},
+    "jobs": [
+        {"module": "lanim.examples.hello", "output": "hello.gif"},
+        {"module": "lanim.examples.showcase", "output": "showcase.mp4", "width": 1280, "height": 720},
+        {"module": "scenes.intro", "export_name": "title", "output": "title.gif", "inputs": ["scenes/*.py"]}
+    ]
+}
+```
+
+Paths are relative to the manifest. Every job accepts the fields of
+[`BatchJob`][lanim.batch.BatchJob], and `defaults` apply to all of them.
+
+A job is skipped if its output exists and none of its inputs changed since
+it was rendered: the settings of the job, the source of its module, the
+files matching its `inputs` patterns and the source of lanim itself. Their
+fingerprint is stored next to the output, in `<output>.fingerprint`.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import asdict, dataclass, fields
+import functools
+import hashlib
+import importlib.util
+import json
+import pathlib
+import shutil
+import subprocess
+from typing import Callable, Optional, Sequence
+
+
+__all__ = [
+    "BatchJob",
+    "read_manifest",
+    "fingerprint",
+    "fingerprint_path",
+    "render_job",
+    "run_batch",
+]
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """
+    A single animation to render, with the same meaning of the fields
+    as the command-line arguments
+    """
+    module: str
+    output: pathlib.Path
+    export_name: str = "export"
+    width: int = 1280
+    height: int = 720
+    fps: int = 30
+    range: tuple[int, int] = (0, 99)
+    draft: Optional[float] = None
+    "Like `--draft FACTOR`: scale the resolution and the frame rate by it"
+    mono: bool = False
+
+    inputs: tuple[pathlib.Path, ...] = ()
+    """
+    Glob patterns of other files the animation depends on, like modules
+    it imports or images it loads. The module itself is always included.
+    """
+
+
+def read_manifest(path: pathlib.Path) -> list[BatchJob]:
+    """
+    Read the jobs of a manifest, resolving paths relative to it
+    """
+    manifest = json.loads(path.read_text("utf-8"))
+    base = path.parent.resolve()
+    known = {field.name for field in fields(BatchJob)}
+    jobs = []
+    for (i, entry) in enumerate(manifest["jobs"]):
+        spec = {**manifest.get("defaults", {}), **entry}
+        unknown = set(spec) - known
+        if unknown:
+            raise ValueError("Job {} has unknown fields: {}".format(i, ", ".join(sorted(unknown))))
+        if "module" not in spec or "output" not in spec:
+            raise ValueError("Job {} needs a `module` and an `output`".format(i))
+        spec["output"] = base / spec["output"]
+        spec["inputs"] = tuple(base / pattern for pattern in spec.get("inputs", ()))
+        if "range" in spec:
+            spec["range"] = tuple(spec["range"])
+        if isinstance(spec.get("draft"), bool):
+            raise ValueError("Job {}: `draft` should be a factor like 0.25 or null".format(i))
+        jobs.append(BatchJob(**spec))
+    return jobs
+
+
+@functools.lru_cache(maxsize=None)
+def _lanim_digest() -> str:
+    """
+    Digest of lanim's own source, so that upgrading it re-renders everything
+    """
+    digest = hashlib.sha256()
+    package = pathlib.Path(__file__).parent
+    for file in sorted(package.rglob("*.py")):
+        digest.update(str(file.relative_to(package)).encode())
+        digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+def _module_file(module: str) -> Optional[pathlib.Path]:
+    spec = importlib.util.find_spec(module)
+    if spec is None:
+        raise ImportError("Module {!r} not found".format(module))
+    return pathlib.Path(spec.origin) if spec.origin and spec.has_location else None
+
+
+def _input_files(job: BatchJob) -> list[pathlib.Path]:
+    files = set()
+    module_file = _module_file(job.module)
+    if module_file is not None:
+        files.add(module_file)
+    for pattern in job.inputs:
+        anchor = pathlib.Path(pattern.anchor)
+        matches = [file for file in anchor.glob(str(pattern.relative_to(anchor))) if file.is_file()]
+        if not matches:
+            raise FileNotFoundError("No files match {}".format(pattern))
+        files.update(matches)
+    return sorted(files)
+
+
+def fingerprint(job: BatchJob) -> str:
+    """
+    Digest of everything the result of a job depends on
+    """
+    digest = hashlib.sha256()
+    settings = {key: value for (key, value) in asdict(job).items() if key not in ("output", "inputs")}
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    digest.update(_lanim_digest().encode())
+    for file in _input_files(job):
+        digest.update(str(file).encode())
+        digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+def fingerprint_path(output: pathlib.Path) -> pathlib.Path:
+    """
+    Where the fingerprint of the job that rendered `output` is stored
+    """
+    return output.with_name(output.name + ".fingerprint")
+
+
+def _is_up_to_date(job: BatchJob, digest: str) -> bool:
+    path = fingerprint_path(job.output)
+    return job.output.exists() and path.exists() and path.read_text("utf-8").strip() == digest
+
+
+def render_job(
+    job: BatchJob,
+    frames_dir: pathlib.Path,
+    threads: int,
+    progress: Optional[Callable[[int, int], None]] = None,
+    before_encode: Callable[[], None] = lambda: None,
+) -> subprocess.Popen[bytes]:
+    """
+    Render the frames of a job into `frames_dir` and start compiling them
+    into its output. `progress` is called with the number of frames saved
+    so far and the total, and `before_encode` once all frames are saved,
+    right before ffmpeg starts. Return the ffmpeg process.
+    """
+    from lanim.core import frame_count
+    from lanim.pil_machinery import render_pil
+    from lanim.standalone import _crop_animation, _drafted, _find_animation, _purge_temp_dir
+
+    (width, height, fps) = _drafted(job.width, job.height, job.fps, job.draft)
+    _purge_temp_dir(frames_dir)
+    animation = _crop_animation(_find_animation(job.module, job.export_name), *job.range)
+    total = frame_count(animation, fps)
+    saved = 0
+    def count(_: int):
+        nonlocal saved
+        saved += 1
+        if progress is not None:
+            progress(saved, total)
+    render_pil(
+        width=width,
+        height=height,
+        animation=animation,
+        path=frames_dir,
+        fps=fps,
+        workers=threads,
+        frame_numbers=range(total),
+        draft=job.draft is not None,
+        mono=job.mono,
+        progress=count,
+    )
+    before_encode()
+    job.output.parent.mkdir(parents=True, exist_ok=True)
+    return subprocess.Popen([
+        "ffmpeg",
+        "-y",  # overwrite the output file
+        "-loglevel", "error",
+        "-framerate", str(fps),
+        "-i", str(frames_dir / "frame_%d.png"),
+        str(job.output),
+    ])
+
+
+def run_batch(
+    jobs: Sequence[BatchJob],
+    temp_dir: pathlib.Path,
+    threads: int,
+    force: bool = False,
+    dry_run: bool = False,
+) -> dict[str, list[BatchJob]]:
+    """
+    Render the jobs that are out of date, one after another, each on
+    `threads` threads. While a job is rendered, the video of the previous
+    one is compiled by ffmpeg in the background, and it's waited for
+    before the next video is started, so only one ffmpeg runs at a time.
+    The frames of a job are deleted once its video is compiled.
+
+    Return the jobs grouped by what happened to them: `rendered`,
+    `skipped` or `failed`.
+    """
+    from lanim.standalone import _require_ffmpeg
+
+    outcome: dict[str, list[BatchJob]] = {"rendered": [], "skipped": [], "failed": []}
+    pending = []
+    for job in jobs:
+        try:
+            digest = fingerprint(job)
+        except (ImportError, OSError) as e:
+            print(f"{job.output}: failed: {e}")
+            outcome["failed"].append(job)
+            continue
+        if not force and _is_up_to_date(job, digest):
+            print(f"{job.output}: up to date")
+            outcome["skipped"].append(job)
+        else:
+            pending.append((job, digest))
+
+    if dry_run:
+        for (job, _) in pending:
+            print(f"{job.output}: would render {job.module}.{job.export_name}")
+        return outcome
+    if pending:
+        _require_ffmpeg()
+
+    encoding: Optional[tuple[BatchJob, str, pathlib.Path, subprocess.Popen[bytes]]] = None
+
+    def finish_encoding():
+        nonlocal encoding
+        if encoding is None:
+            return
+        (job, digest, frames_dir, ffmpeg_process) = encoding
+        encoding = None
+        if ffmpeg_process.wait() != 0:
+            print(f"{job.output}: ffmpeg failed, its frames are kept in {frames_dir}")
+            outcome["failed"].append(job)
+            return
+        shutil.rmtree(frames_dir, ignore_errors=True)
+        fingerprint_path(job.output).write_text(digest, "utf-8")
+        outcome["rendered"].append(job)
+
+    for (i, (job, digest)) in enumerate(pending):
+        print(f"{job.output}: rendering {job.module}.{job.export_name} ({i + 1}/{len(pending)})")
+        frames_dir = temp_dir / str(i)
+        try:
+            ffmpeg_process = render_job(job, frames_dir, threads, before_encode=finish_encoding)
+        except Exception as e:
+            print(f"{job.output}: failed: {e!r}")
+            outcome["failed"].append(job)
+            continue
+        finally:
+            finish_encoding()  # in case rendering failed before `before_encode`
+        encoding = (job, digest, frames_dir, ffmpeg_process)
+    finish_encoding()
+    return outcome
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="Render the animations listed in a manifest")
+    parser.add_argument("manifest", type=pathlib.Path, help="JSON file listing the jobs")
+    parser.add_argument(
+        "-t", "--threads",
+        type=int,
+        help="Number of threads to launch for each job. Defaults to CPU count",
+        default=multiprocessing.cpu_count(),
+    )
+    parser.add_argument(
+        "-p", "--temp-dir",
+        metavar="PATH",
+        type=pathlib.Path,
+        help="Temporary working directory. Defaults to .lanim-batch in the current working directory",
+        default=pathlib.Path("./.lanim-batch"),
+    )
+    parser.add_argument("--force", action="store_true", help="Render every job, even if it's up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only print which jobs would be rendered")
+    args = parser.parse_args()
+
+    outcome = run_batch(read_manifest(args.manifest), args.temp_dir, args.threads, args.force, args.dry_run)
+    print(", ".join(f"{len(jobs)} {what}" for (what, jobs) in outcome.items()))
+    if outcome["failed"]:
+        raise SystemExit(1)
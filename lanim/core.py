@@ -31,7 +31,7 @@ Hello, world!
 from __future__ import annotations
 from dataclasses import dataclass, replace as dataclass_replace
 from typing import Callable, Generic, Iterable, Iterator, TypeVar, Union, overload
-from lanim.easings import Easing
+from lanim.easings import Easing, compose
 
 
 A = TypeVar("A", covariant=True)
@@ -57,6 +57,9 @@ __all__ = [
     "par_a_shortest",
     "pause_after",
     "pause_before",
+    "frame_count",
+    "frame_progress",
+    "shard_range",
     "frames",
 ]
 
@@ -213,8 +216,19 @@ def ease_p(proj: Projector[A], e: Easing) -> Projector[A]:
     >>> projector2(0.54)
     (1.832, 2.443)
     ```
+
+    Easing an eased projector composes the two easings instead of nesting
+    the projectors, so with [tables][lanim.easings.tabulate] any number of
+    easings costs a single lookup per frame.
     """
-    return lambda t: proj(e(t))
+    inner = getattr(proj, "_eased", None)
+    if inner is not None:
+        (proj, first) = inner
+        e = compose(e, first)
+    f = getattr(e, "scalar", e)
+    eased = lambda t: proj(f(t))
+    eased._eased = (proj, e)  # type: ignore
+    return eased
 
 
 def const_a(a: C) -> Animation[C]:
@@ -352,11 +366,39 @@ def crop_by_range(anim: Animation[A], start: float, finish: float) -> Animation[
     return Animation(new_duration, projector)
 
 
+def frame_count(animation: Animation[A], fps: float) -> int:
+    """
+    Number of discrete frames [`frames`][lanim.core.frames] generates
+    for an animation.
+    """
+    return round(fps * animation.duration) + 1
+
+
+def frame_progress(animation: Animation[A], fps: float, index: int) -> float:
+    """
+    Progress (from 0 to 1) at which the frame number `index` is taken.
+    """
+    return index / round(fps * animation.duration)
+
+
+def shard_range(total: int, shard: int, shards: int) -> range:
+    """
+    Split frame numbers from `0` to `total - 1` into `shards` contiguous
+    pieces of (almost) equal size and return the piece number `shard`,
+    counting from zero. Together, the pieces cover every frame exactly once.
+    """
+    if not (0 <= shard < shards):
+        raise ValueError(
+            "Invalid shard {} out of {}. Expected 0 <= shard < shards"
+            .format(shard, shards)
+        )
+    return range(total * shard // shards, total * (shard + 1) // shards)
+
+
 def frames(animation: Animation[A], fps: float) -> Iterator[A]:
     """
     Generate a series of discrete frames from an animation given
     the frames per second.
     """
-    total_steps = round(fps * animation.duration)
-    for step in range(total_steps + 1):
-        yield animation.projector(step / total_steps)
+    for step in range(frame_count(animation, fps)):
+        yield animation.projector(frame_progress(animation, fps, step))
@@ -0,0 +1,412 @@
+"""
+A long-running render service, so that many short renders don't each pay
+for starting Python, importing lanim and warming up the LaTeX cache.
+
+Start the daemon and then submit jobs to it:
+```
+python -m lanim.daemon serve /tmp/lanim.sock
+python -m lanim.daemon submit /tmp/lanim.sock lanim.examples.hello -o hello.mp4 -w 640 -h 360
+python -m lanim.daemon status /tmp/lanim.sock
+python -m lanim.daemon shutdown /tmp/lanim.sock
+```
+
+The address is `HOST:PORT` for TCP or a path for a Unix socket, like for
+`lanim.farm`, and connections are authenticated with the same
+`LANIM_FARM_KEY`, see `lanim.auth`. Since the daemon runs whatever scene
+module it's given, the key must be set explicitly, also for Unix sockets.
+Jobs are rendered one at a time, highest priority first,
+each of them with all the daemon's threads. `submit` waits for its job and
+prints its progress, unless `--no-wait` is given.
+
+Before each job, the scene modules loaded by the previous ones are
+forgotten, so edits to them are picked up, but lanim and its caches stay
+loaded. Modules are imported relative to the directory `submit` was run in.
+The frames of a job are deleted once its video is compiled, and only the
+last `FINISHED_JOBS_KEPT` finished jobs are remembered.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field, replace
+import heapq
+import itertools
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+import pathlib
+import shutil
+import sys
+from threading import Condition, Lock, Thread
+import time
+import traceback
+from typing import Any, Callable, Optional
+
+from lanim.auth import Address, authkey
+from lanim.batch import BatchJob, render_job
+from lanim.farm import parse_address
+
+
+__all__ = [
+    "serve",
+    "submit",
+    "status",
+    "shutdown",
+]
+
+
+FINISHED_JOBS_KEPT = 100
+"How many done or failed jobs `status` still reports"
+
+
+@dataclass
+class _Entry:
+    """
+    A job in the daemon's queue
+    """
+    id: int
+    job: BatchJob
+    priority: int
+    directory: pathlib.Path
+    state: str = "queued"
+    "`queued`, `running`, `done` or `failed`"
+
+    frames: int = 0
+    total: int = 0
+    listeners: list[Callable[[tuple[Any, ...]], None]] = field(default_factory=list)
+
+    def describe(self) -> tuple[Any, ...]:
+        return (self.id, self.state, self.priority, self.job.module, self.job.export_name,
+                str(self.job.output), self.frames, self.total)
+
+
+class _Daemon:
+    def __init__(self, temp_dir: pathlib.Path, threads: int):
+        self.temp_dir = temp_dir
+        self.threads = threads
+        self.condition = Condition()
+        self.queue: list[tuple[int, int, _Entry]] = []
+        self.entries: dict[int, _Entry] = {}
+        self.ids = itertools.count(1)
+        self.stopping = False
+
+    def add(
+        self,
+        job: BatchJob,
+        priority: int,
+        directory: pathlib.Path,
+        listener: Optional[Callable[[tuple[Any, ...]], None]],
+    ) -> tuple[_Entry, int]:
+        """
+        Queue a job and return it with the number of jobs ahead of it
+        """
+        with self.condition:
+            entry = _Entry(next(self.ids), job, priority, directory)
+            if listener is not None:
+                entry.listeners.append(listener)
+            self.entries[entry.id] = entry
+            # higher priority first, then first come, first served
+            key = (-priority, entry.id)
+            heapq.heappush(self.queue, (*key, entry))
+            self.condition.notify_all()
+            return (entry, sum(1 for (p, i, _) in self.queue if (p, i) < key))
+
+    def notify(self, entry: _Entry, message: tuple[Any, ...]):
+        for listener in list(entry.listeners):
+            try:
+                listener(message)
+            except (OSError, EOFError):
+                entry.listeners.remove(listener)  # the client went away, the job goes on
+
+    def run_jobs(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue or self.stopping)
+                if self.stopping:
+                    return
+                (_, _, entry) = heapq.heappop(self.queue)
+                entry.state = "running"
+            self.run(entry)
+
+    def run(self, entry: _Entry):
+        from lanim.standalone import _user_modules
+
+        job = entry.job
+        print(f"Job {entry.id}: rendering {job.module}.{job.export_name} into {job.output}")
+        t1 = time.time()
+        for name in _user_modules():
+            sys.modules.pop(name, None)
+        sys.path.insert(0, str(entry.directory))
+
+        def progress(frames: int, total: int):
+            entry.frames, entry.total = frames, total
+            self.notify(entry, ("progress", entry.id, frames, total))
+
+        frames_dir = self.temp_dir / str(entry.id)
+        try:
+            ffmpeg_process = render_job(job, frames_dir, self.threads, progress)
+            if ffmpeg_process.wait() != 0:
+                raise RuntimeError("ffmpeg failed")
+            shutil.rmtree(frames_dir, ignore_errors=True)
+        except Exception:
+            entry.state = "failed"
+            print(f"Job {entry.id}: failed, its frames are kept in {frames_dir}")
+            self.notify(entry, ("failed", entry.id, traceback.format_exc()))
+        else:
+            entry.state = "done"
+            print(f"Job {entry.id}: done in {time.time() - t1:.1f}s")
+            self.notify(entry, ("done", entry.id, time.time() - t1))
+        finally:
+            sys.path.remove(str(entry.directory))
+            with self.condition:
+                entry.listeners.clear()
+                self.forget_finished()
+                self.condition.notify_all()
+
+    def forget_finished(self):
+        """
+        Drop the oldest done or failed jobs over `FINISHED_JOBS_KEPT`.
+        Must be called with `condition` held.
+        """
+        finished = [i for (i, entry) in self.entries.items() if entry.state in ("done", "failed")]
+        for i in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self.entries[i]
+
+    def serve(self, conn: Connection):
+        send_lock = Lock()
+        def send(message: tuple[Any, ...]):
+            with send_lock:
+                conn.send(message)
+
+        try:
+            kind, *args = conn.recv()
+            if kind == "submit":
+                job, priority, directory, wait = args
+                problem = _check_submission(job, priority, directory)
+                if problem is not None:
+                    send(("rejected", problem))
+                    return
+                (entry, position) = self.add(job, priority, directory, send if wait else None)
+                send(("queued", entry.id, position))
+                if wait:
+                    with self.condition:
+                        self.condition.wait_for(lambda: entry.state in ("done", "failed") or self.stopping)
+            elif kind == "status":
+                with self.condition:
+                    send(("status", [entry.describe() for entry in self.entries.values()]))
+            elif kind == "shutdown":
+                with self.condition:
+                    self.stopping = True
+                    self.condition.notify_all()
+                send(("stopping",))
+            else:
+                raise ConnectionError(f"Unexpected message {kind!r}")
+        except (EOFError, OSError, ConnectionError) as e:
+            print(f"Lost a client: {e!r}")
+        finally:
+            conn.close()
+
+
+def _check_submission(job: Any, priority: Any, directory: Any) -> Optional[str]:
+    """
+    What's wrong with a submitted job, if anything. Its directory
+    is put into `sys.path` while it renders, so it must exist.
+    """
+    if not isinstance(job, BatchJob) or not isinstance(priority, int):
+        return "Malformed job"
+    if not isinstance(directory, pathlib.Path) or not directory.is_absolute() or not directory.is_dir():
+        return f"{directory!r} is not a directory"
+    return None
+
+
+def serve(address: Address, temp_dir: pathlib.Path, threads: int):
+    """
+    Accept jobs at `address` and render them until asked to shut down.
+    The job that is being rendered at that moment is finished first.
+    """
+    from lanim.standalone import _require_ffmpeg
+
+    key = authkey()
+    _require_ffmpeg()
+    daemon = _Daemon(temp_dir, threads)
+    listener = Listener(address, authkey=key)
+
+    def accept_loop():
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                print("A client failed to authenticate")
+                continue
+            except OSError:
+                return  # the listener is closed
+            Thread(target=daemon.serve, args=(conn,), daemon=True).start()
+
+    runner = Thread(target=daemon.run_jobs, name="jobs")
+    runner.start()
+    print(f"Waiting for jobs at {address!r} with {threads} threads")
+    Thread(target=accept_loop, daemon=True).start()
+    try:
+        runner.join()
+    except KeyboardInterrupt:
+        with daemon.condition:
+            daemon.stopping = True
+            daemon.condition.notify_all()
+        runner.join()
+    finally:
+        listener.close()
+        # wake up the clients still waiting for their jobs
+        with daemon.condition:
+            daemon.condition.notify_all()
+
+
+def _request(address: Address, message: tuple[Any, ...]) -> Connection:
+    conn = Client(address, authkey=authkey())
+    conn.send(message)
+    return conn
+
+
+def submit(
+    address: Address,
+    job: BatchJob,
+    priority: int = 0,
+    wait: bool = True,
+    on_progress: Callable[[int, int], None] = lambda frames, total: None,
+) -> int:
+    """
+    Queue a job on the daemon at `address` and return its id. With `wait`,
+    return only once the job is rendered, raising `RuntimeError` if it failed.
+    Relative paths and modules are resolved against the current directory.
+    """
+    job = replace(job, output=job.output.resolve())
+    conn = _request(address, ("submit", job, priority, pathlib.Path.cwd(), wait))
+    try:
+        kind, *args = conn.recv()
+        if kind == "rejected":
+            raise RuntimeError(f"The daemon rejected the job: {args[0]}")
+        job_id = args[0]
+        if not wait:
+            return job_id
+        while True:
+            try:
+                kind, *args = conn.recv()
+            except EOFError:
+                raise RuntimeError(f"The daemon stopped before finishing job {job_id}") from None
+            if kind == "progress":
+                on_progress(args[1], args[2])
+            elif kind == "failed":
+                raise RuntimeError(f"Job {job_id} failed:\n{args[1]}")
+            elif kind == "done":
+                return job_id
+    finally:
+        conn.close()
+
+
+def status(address: Address) -> list[tuple[Any, ...]]:
+    """
+    All the jobs the daemon has received: their id, state, priority, module,
+    export name, output, frames saved so far and the total number of frames
+    """
+    conn = _request(address, ("status",))
+    try:
+        _, entries = conn.recv()
+        return entries
+    finally:
+        conn.close()
+
+
+def shutdown(address: Address):
+    """
+    Ask the daemon to stop after the job it's rendering now
+    """
+    conn = _request(address, ("shutdown",))
+    try:
+        conn.recv()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    # -h conflicts with the `height` option of `submit`, so we need to change it
+    parser = argparse.ArgumentParser(description="Render service and its client", add_help=False)
+    parser.add_argument("-?", "--help", action="help", help="Show the reference")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Start the daemon")
+    serve_parser.add_argument("address", help="HOST:PORT or a path to a Unix socket")
+    serve_parser.add_argument(
+        "-t", "--threads",
+        type=int,
+        help="Number of threads to launch. Defaults to CPU count",
+        default=multiprocessing.cpu_count(),
+    )
+    serve_parser.add_argument(
+        "-p", "--temp-dir",
+        metavar="PATH",
+        type=pathlib.Path,
+        help="Temporary working directory. Defaults to .lanim-daemon in the current working directory",
+        default=pathlib.Path("./.lanim-daemon"),
+    )
+
+    submit_parser = commands.add_parser("submit", help="Render an animation on the daemon", add_help=False)
+    submit_parser.add_argument("-?", "--help", action="help", help="Show the reference")
+    submit_parser.add_argument("address", help="HOST:PORT or a path to a Unix socket")
+    submit_parser.add_argument("module", help="Python module to animate")
+    submit_parser.add_argument("-e", "--export-name", metavar="IDENTIFIER", default="export")
+    submit_parser.add_argument("-o", "--output", metavar="PATH", type=pathlib.Path, required=True)
+    submit_parser.add_argument("-w", "--width", type=int, default=1280)
+    submit_parser.add_argument("-h", "--height", type=int, default=720)
+    submit_parser.add_argument("-f", "--fps", type=int, default=30)
+    submit_parser.add_argument(
+        "--draft",
+        metavar="FACTOR",
+        type=float,
+        nargs="?",
+        const=0.25,
+        help="Scale the resolution and the frame rate by FACTOR (0.25 by default)",
+    )
+    submit_parser.add_argument("--mono", action="store_true")
+    submit_parser.add_argument("--priority", type=int, default=0, help="Jobs with higher priority are rendered first")
+    submit_parser.add_argument("--no-wait", action="store_true", help="Return as soon as the job is queued")
+
+    for name in ("status", "shutdown"):
+        command_parser = commands.add_parser(name)
+        command_parser.add_argument("address", help="HOST:PORT or a path to a Unix socket")
+
+    args = parser.parse_args()
+    address = parse_address(args.address)
+
+    def show_progress(frames: int, total: int):
+        print(f"\r{frames}/{total} frames", end="", flush=True)
+
+    try:
+        if args.command == "serve":
+            serve(address, args.temp_dir, args.threads)
+        elif args.command == "submit":
+            job_id = submit(
+                address,
+                BatchJob(
+                    module=args.module,
+                    output=args.output,
+                    export_name=args.export_name,
+                    width=args.width,
+                    height=args.height,
+                    fps=args.fps,
+                    draft=args.draft,
+                    mono=args.mono,
+                ),
+                priority=args.priority,
+                wait=not args.no_wait,
+                on_progress=show_progress,
+            )
+            print(f"\nJob {job_id}: " + ("queued" if args.no_wait else f"done, {args.output}"))
+        elif args.command == "status":
+            for (job_id, state, priority, module, export_name, output, frames, total) in status(address):
+                print(f"{job_id}: {state} (priority {priority}) {module}.{export_name} -> {output} [{frames}/{total}]")
+        else:
+            shutdown(address)
+    except RuntimeError as e:
+        print()
+        print(e, file=sys.stderr)
+        sys.exit(1)
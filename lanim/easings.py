@@ -1,22 +1,143 @@
 """
 Useful easings. For demo see:
 https://www.desmos.com/calculator/
+
+Any function from `[0; 1]` to numbers can be used as an easing. The ones
+defined here are `VectorEasing`s: besides being called on a single `t`,
+they can be evaluated on a whole NumPy array of moments at once with
+[`sample`][lanim.easings.sample], and turned into a lookup table with
+[`tabulate`][lanim.easings.tabulate].
 """
+from __future__ import annotations
+
 import math
-from typing import Callable
+from typing import Any, Callable, Iterable, Optional, Sequence
 
 
 Easing = Callable[[float], float]
 
+VectorForm = Callable[[Any, Any], Any]
+"Function of the `numpy` module and an array of moments"
+
+
+def _numpy():
+    """
+    Import NumPy, which is only needed by some features, like evaluating
+    easings in batches or `GroupArray`
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("This feature needs NumPy: `pip install numpy`") from None
+    return numpy
+
+
+class VectorEasing:
+    """
+    Easing with a vectorized form that computes the same thing for an array
+    of moments. If it was made by `tabulate`, `table` holds the values at
+    `len(table) - 1` equal steps.
+    """
+
+    __slots__ = ("scalar", "vector", "table")
+
+    def __init__(self, scalar: Easing, vector: VectorForm, table: Optional[Sequence[float]] = None):
+        self.scalar = scalar
+        self.vector = vector
+        self.table = table
+
+    def __call__(self, t: float) -> float:
+        return self.scalar(t)
+
+    def many(self, ts: Any) -> Any:
+        np = _numpy()
+        return self.vector(np, np.asarray(ts, dtype=float))
+
+
+def sample(e: Easing, ts: Iterable[float]) -> Any:
+    """
+    Evaluate an easing at many moments at once, returning a NumPy array.
+    Easings without a vectorized form are called once per moment.
+    """
+    if isinstance(e, VectorEasing):
+        return e.many(ts if hasattr(ts, "__len__") else list(ts))
+    np = _numpy()
+    return np.fromiter((e(t) for t in ts), dtype=float)
+
+
+def tabulate(e: Easing, size: int = 1024) -> VectorEasing:
+    """
+    Precompute an easing at `size + 1` evenly spaced moments and interpolate
+    linearly between them. Outside of `[0; 1]`, the first and last steps are
+    extended.
+    """
+    if size < 1:
+        raise ValueError(f"A table needs at least one step, got {size}")
+    if isinstance(e, VectorEasing) and e.table is not None and len(e.table) == size + 1:
+        return e
+    values = tuple(float(e(i / size)) for i in range(size + 1))
+    last = size - 1
+
+    def scalar(t: float) -> float:
+        x = t * size
+        i = int(x)
+        if i > last:
+            i = last
+        elif i < 0:
+            i = 0
+        a = values[i]
+        return a + (values[i + 1] - a) * (x - i)
+
+    table_array: list[Any] = []
+
+    def vector(np: Any, ts: Any) -> Any:
+        if not table_array:
+            table_array.append(np.array(values))
+        table = table_array[0]
+        xs = ts * size
+        i = np.clip(np.floor(xs), 0, last).astype(int)
+        a = table[i]
+        return a + (table[i + 1] - a) * (xs - i)
+
+    return VectorEasing(scalar, vector, values)
+
+
+def _vector_form(e: Easing) -> VectorForm:
+    if isinstance(e, VectorEasing):
+        return e.vector
+    return lambda np, ts: np.fromiter((e(t) for t in ts.flat), dtype=float, count=ts.size).reshape(ts.shape)
+
+
+def _combine(scalar: Easing, vector: VectorForm, e1: Easing, e2: Easing) -> Easing:
+    """
+    Keep the vectorized form if one of the arguments has one
+    """
+    if isinstance(e1, VectorEasing) or isinstance(e2, VectorEasing):
+        return VectorEasing(scalar, vector)
+    return scalar
+
 
 def compose(e1: Easing, e2: Easing) -> Easing:
-    return lambda t: e2(e1(t))
+    """
+    Apply `e1`, then `e2`. If either of them is a table, so is the result,
+    so easing an animation twice costs a single lookup.
+    """
+    tables = [e.table for e in (e1, e2) if isinstance(e, VectorEasing) and e.table is not None]
+    f1 = getattr(e1, "scalar", e1)
+    f2 = getattr(e2, "scalar", e2)
+    scalar: Easing = lambda t: f2(f1(t))
+    if tables:
+        return tabulate(scalar, max(len(table) for table in tables) - 1)
+    v1, v2 = _vector_form(e1), _vector_form(e2)
+    return _combine(scalar, lambda np, ts: v2(np, v1(np, ts)), e1, e2)
 
 def product(e1: Easing, e2: Easing) -> Easing:
-    return lambda t: e1(t) * e2(t)
+    v1, v2 = _vector_form(e1), _vector_form(e2)
+    return _combine(lambda t: e1(t) * e2(t), lambda np, ts: v1(np, ts) * v2(np, ts), e1, e2)
 
 def average(e1: Easing, e2: Easing) -> Easing:
-    return lambda t: (e1(t) + e2(t))/2
+    v1, v2 = _vector_form(e1), _vector_form(e2)
+    return _combine(lambda t: (e1(t) + e2(t))/2, lambda np, ts: (v1(np, ts) + v2(np, ts))/2, e1, e2)
 
 
 """
@@ -38,10 +159,16 @@ def average(e1: Easing, e2: Easing) -> Easing:
 .......XXX.
 XXXXXXX...
 """
-in_out: Easing = lambda t: 4*t**3 if t < 0.5 else -4*(1 - t)**3 + 1
+in_out = VectorEasing(
+    lambda t: 4*t**3 if t < 0.5 else -4*(1 - t)**3 + 1,
+    lambda np, t: np.where(t < 0.5, 4*t**3, -4*(1 - t)**3 + 1),
+)
 
 
-back_and_forth: Easing = lambda t: 1 - 2 * abs(0.5 - t)
+back_and_forth = VectorEasing(
+    lambda t: 1 - 2 * abs(0.5 - t),
+    lambda np, t: 1 - 2 * np.abs(0.5 - t),
+)
 
 
 """
@@ -63,7 +190,10 @@ XX.
                            ...X..
                               .XX
 """
-invert: Easing = lambda t: 1 - t
+invert = VectorEasing(
+    lambda t: 1 - t,
+    lambda np, t: 1 - t,
+)
 
 
 
@@ -86,7 +216,10 @@ invert: Easing = lambda t: 1 - t
 .X.
 X.
 """
-iquad: Easing = lambda t: 1 - (1 - t)**2
+iquad = VectorEasing(
+    lambda t: 1 - (1 - t)**2,
+    lambda np, t: 1 - (1 - t)**2,
+)
 
 
 
@@ -109,7 +242,10 @@ iquad: Easing = lambda t: 1 - (1 - t)**2
 ..X...
 XX.
 """
-linear: Easing = lambda t: t
+linear = VectorEasing(
+    lambda t: t,
+    lambda np, t: t,
+)
 
 
 
@@ -132,7 +268,10 @@ linear: Easing = lambda t: t
 ......XXXX...
 XXXXXX....
 """
-quadratic: Easing = lambda t: t**2
+quadratic = VectorEasing(
+    lambda t: t**2,
+    lambda np, t: t**2,
+)
 
 
 
@@ -155,7 +294,10 @@ quadratic: Easing = lambda t: t**2
 .........XXXX..
 XXXXXXXXX....
 """
-sled: Easing = lambda t: (math.log(1 + t)/math.log(2))**math.pi
+sled = VectorEasing(
+    lambda t: (math.log(1 + t)/math.log(2))**math.pi,
+    lambda np, t: (np.log1p(t)/math.log(2))**math.pi,
+)
 
 
 
@@ -170,7 +312,7 @@ if __name__ == "__main__":
     for name in dir(easings):
         if name.islower() and not name.startswith("_"):
             f = getattr(easings, name)
-            if not hasattr(f, "__call__"):
+            if not isinstance(f, easings.VectorEasing):
                 continue
             print('"""')
             r = [[" "]*(WIDTH + 1) for _ in range(HEIGHT + 1)]
@@ -185,6 +327,6 @@ if __name__ == "__main__":
             for y in range(HEIGHT + 1):
                 print("".join(map(r[y].__getitem__, range(WIDTH + 1))))
             print('"""')
-            print(inspect.getsource(f))
+            print(inspect.getsource(f.scalar))
             print()
             print()
@@ -0,0 +1,343 @@
+"""
+Distributed rendering: a coordinator hands out chunks of frames to worker
+processes over a socket and collects the rendered frames.
+
+Start the coordinator with `python -m lanim ... --farm ADDRESS` and the
+workers with:
+```
+python -m lanim.farm ADDRESS
+```
+
+`ADDRESS` is either `HOST:PORT` for TCP or a path for a Unix socket.
+Workers import the same scene module as the coordinator, so they should run
+in the same directory (or at least have the same modules available).
+Connections are authenticated with the key from the `LANIM_FARM_KEY`
+environment variable, which should be the same on all machines. Messages
+are pickled, so anyone who knows the key can run code on the coordinator
+and the workers: a coordinator listening on anything but a Unix socket or
+a loopback address refuses to start without an explicit key. On local
+addresses, a random key is made up and passed on to the workers it starts.
+
+Workers send heartbeats while they render. If a worker disconnects or stops
+responding, its unfinished frames are handed out to other workers. If no
+worker is connected for `WORKER_TIMEOUT` seconds while frames are still
+missing, the coordinator gives up.
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+import os
+from pathlib import Path
+import subprocess
+import sys
+from threading import Condition, Event, Lock, Thread
+import time
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from lanim import pil_utils
+from lanim.auth import Address, authkey, listener_authkey
+from lanim.pil_machinery import (
+    default_settings, encode_stage, evaluate_stage, rasterize_stage
+)
+from lanim.pipeline import Stage, run_pipeline
+
+
+__all__ = [
+    "FarmJob",
+    "parse_address",
+    "serve_frames",
+    "run_worker",
+    "spawn_local_workers",
+]
+
+
+HEARTBEAT_INTERVAL = 1.0
+"How often workers report that they're alive, in seconds"
+
+HEARTBEAT_TIMEOUT = 10.0
+"After how many seconds of silence a worker is considered dead"
+
+WORKER_TIMEOUT = 120.0
+"After how many seconds without any workers the coordinator gives up"
+
+
+@dataclass(frozen=True)
+class FarmJob:
+    """
+    What the workers should render
+    """
+    module: str
+    export_name: str
+    width: int
+    height: int
+    fps: int
+    range: tuple[int, int]
+    draft: bool = False
+    mono: bool = False
+
+
+def parse_address(s: str) -> Address:
+    """
+    Parse `HOST:PORT` as a TCP address and anything else as a path
+    to a Unix socket
+    """
+    host, sep, port = s.rpartition(":")
+    if sep and port.isdigit() and "/" not in s:
+        return (host or "127.0.0.1", int(port))
+    return s
+
+
+# Coordinator:
+
+class _Coordinator:
+    def __init__(self, job: FarmJob, path: Path, frame_numbers: Sequence[int], chunk_size: int, ship_latex_cache: bool):
+        self.job = job
+        self.path = path
+        self.ship_latex_cache = ship_latex_cache
+        self.pending: deque[list[int]] = deque(
+            list(frame_numbers[i:i + chunk_size])
+            for i in range(0, len(frame_numbers), chunk_size)
+        )
+        self.remaining = set(frame_numbers)
+        self.condition = Condition()
+        self.workers = 0
+        self.idle_since = time.monotonic()
+
+    def done(self) -> bool:
+        return not self.remaining
+
+    def take(self) -> Optional[list[int]]:
+        """
+        Wait for a chunk to render. Return `None` when all frames are rendered.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending or self.done())
+            if self.done():
+                return None
+            return self.pending.popleft()
+
+    def store(self, index: int, data: bytes):
+        with self.condition:
+            if index not in self.remaining:
+                return  # a worker we considered dead has delivered after all
+            (self.path / f"frame_{index}.png").write_bytes(data)
+            self.remaining.discard(index)
+            self.condition.notify_all()
+
+    def requeue(self, chunk: list[int]):
+        with self.condition:
+            left = [i for i in chunk if i in self.remaining]
+            if left:
+                print(f"Reassigning {len(left)} frames of a dead worker")
+                self.pending.appendleft(left)
+                self.condition.notify_all()
+
+    def latex_cache(self) -> dict[str, bytes]:
+        if not self.ship_latex_cache or not pil_utils.CACHE_DIR.exists():
+            return {}
+        return {file.name: file.read_bytes() for file in pil_utils.CACHE_DIR.glob("*.png")}
+
+    def wait(self, idle_timeout: Optional[float]):
+        """
+        Wait until all frames are rendered, raising `RuntimeError` if no
+        worker is connected for `idle_timeout` seconds before that
+        """
+        with self.condition:
+            while not self.done():
+                if self.workers or idle_timeout is None:
+                    self.condition.wait()
+                    continue
+                left = self.idle_since + idle_timeout - time.monotonic()
+                if left <= 0:
+                    raise RuntimeError(
+                        f"No workers for {idle_timeout:.0f}s with {len(self.remaining)} frames left"
+                    )
+                self.condition.wait(left)
+
+    def serve(self, conn: Connection):
+        chunk: Optional[list[int]] = None
+        with self.condition:
+            self.workers += 1
+        try:
+            kind, *_ = self._recv(conn)
+            if kind != "hello":
+                raise ConnectionError(f"Expected a greeting, got {kind!r}")
+            conn.send(("job", self.job))
+            conn.send(("latex_cache", self.latex_cache()))
+            while True:
+                kind, *args = self._recv(conn)
+                if kind == "ready":
+                    chunk = self.take()
+                    if chunk is None:
+                        conn.send(("done",))
+                        return
+                    conn.send(("chunk", chunk))
+                elif kind == "frame":
+                    self.store(*args)
+                elif kind == "chunk_done":
+                    chunk = None
+                elif kind != "heartbeat":
+                    raise ConnectionError(f"Unexpected message {kind!r}")
+        except (EOFError, OSError, ConnectionError, TimeoutError) as e:
+            print(f"Lost a worker: {e!r}")
+        finally:
+            if chunk is not None:
+                self.requeue(chunk)
+            conn.close()
+            with self.condition:
+                self.workers -= 1
+                self.idle_since = time.monotonic()
+                self.condition.notify_all()
+
+    def _recv(self, conn: Connection) -> tuple[Any, ...]:
+        if not conn.poll(HEARTBEAT_TIMEOUT):
+            raise TimeoutError("Worker stopped responding")
+        return conn.recv()
+
+
+def serve_frames(
+    address: Address,
+    job: FarmJob,
+    path: Path,
+    frame_numbers: Sequence[int],
+    chunk_size: int = 16,
+    ship_latex_cache: bool = True,
+    on_listen: Callable[[], None] = lambda: None,
+    idle_timeout: Optional[float] = WORKER_TIMEOUT,
+):
+    """
+    Hand out `frame_numbers` of `job` in chunks to workers connecting to
+    `address` and save the frames they render as `frame_N.png` files in
+    `path`, just like [`render_pil`][lanim.pil_machinery.render_pil] does.
+
+    If `ship_latex_cache` is set, the LaTeX images rendered so far are sent
+    to each worker, so they don't have to be compiled again.
+    `on_listen` is called as soon as the coordinator accepts connections.
+    If frames are still missing and no worker has been connected for
+    `idle_timeout` seconds, `RuntimeError` is raised.
+    """
+    key = listener_authkey(address)
+    path.mkdir(parents=True, exist_ok=True)
+    coordinator = _Coordinator(job, path, frame_numbers, chunk_size, ship_latex_cache)
+
+    listener = Listener(address, authkey=key)
+
+    def accept_loop():
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                print("A worker failed to authenticate")
+                continue
+            except OSError:
+                return  # the listener is closed
+            Thread(target=coordinator.serve, args=(conn,), daemon=True).start()
+
+    print(f"Waiting for workers at {address!r} to render {len(frame_numbers)} frames")
+    Thread(target=accept_loop, daemon=True).start()
+    on_listen()
+    try:
+        coordinator.wait(idle_timeout)
+    finally:
+        listener.close()
+
+
+def spawn_local_workers(address: Address, count: int, threads: int = 1) -> list[subprocess.Popen[bytes]]:
+    """
+    Start `count` worker processes on this machine
+    """
+    address_str = address if isinstance(address, str) else "{}:{}".format(*address)
+    return [
+        subprocess.Popen([sys.executable, "-m", "lanim.farm", address_str, "--threads", str(threads)])
+        for _ in range(count)
+    ]
+
+
+# Worker:
+
+def _unpack_latex_cache(files: dict[str, bytes]):
+    pil_utils.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for (name, data) in files.items():
+        target = pil_utils.CACHE_DIR / Path(name).name
+        if not target.exists():
+            target.write_bytes(data)
+
+
+def _render_chunk(job: FarmJob, animation: Any, chunk: Iterable[int], threads: int, send: Callable[[Any], None]):
+    def make_sender() -> Callable[[int, bytes], None]:
+        return lambda index, data: send(("frame", index, data))
+
+    run_pipeline(
+        ((i, i) for i in chunk),
+        [
+            evaluate_stage(animation, job.fps),
+            rasterize_stage(default_settings(job.width, job.height, job.draft, job.mono), threads),
+            encode_stage(threads),
+            Stage("send", make_sender),
+        ],
+        queue_size=2 * threads,
+    )
+
+
+def run_worker(address: Address, threads: int = 1):
+    """
+    Connect to a coordinator and render the chunks of frames it hands out
+    until there are none left
+    """
+    from lanim.standalone import _crop_animation, _find_animation
+
+    conn = Client(address, authkey=authkey())
+    send_lock = Lock()
+    def send(message: Any):
+        with send_lock:
+            conn.send(message)
+
+    stopped = Event()
+    def heartbeat():
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            send(("heartbeat",))
+
+    try:
+        send(("hello",))
+        _, job = conn.recv()
+        _, cache = conn.recv()
+        _unpack_latex_cache(cache)
+
+        # importing the scene can take a while, e.g. if it measures LaTeX
+        Thread(target=heartbeat, daemon=True).start()
+        animation = _find_animation(job.module, job.export_name)
+        animation = _crop_animation(animation, *job.range)
+
+        while True:
+            send(("ready",))
+            try:
+                kind, *args = conn.recv()
+            except EOFError:
+                break  # the coordinator has collected all frames and quit
+            if kind == "done":
+                break
+            [chunk] = args
+            _render_chunk(job, animation, chunk, threads, send)
+            send(("chunk_done",))
+    finally:
+        stopped.set()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render frames for a lanim coordinator")
+    parser.add_argument("address", help="HOST:PORT or a path to a Unix socket")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="Number of threads to launch")
+    args = parser.parse_args()
+
+    # behave like `python -m lanim` when importing the scene module
+    sys.path.insert(0, os.getcwd())
+    try:
+        run_worker(parse_address(args.address), args.threads)
+    except RuntimeError as e:
+        sys.exit(str(e))
@@ -0,0 +1,97 @@
+"""
+Frames in shared memory, so that worker processes can draw them and the
+main process can encode them without copying or pickling the pixels.
+
+A `FrameRing` is a fixed number of preallocated frame slots. A worker
+takes a free slot, draws into it through a `PilContext` created over the
+slot's memory, and sends the slot number to the consumer, which reads the
+image in place and then releases the slot.
+
+The ring must be created before the worker processes are forked, so that
+they inherit the shared memory and the queue of free slots.
+"""
+
+from __future__ import annotations
+
+from multiprocessing.context import BaseContext
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Optional
+
+from PIL import Image
+
+from lanim.pil_types import CanvasPool, PilContext, PilSettings
+
+
+__all__ = [
+    "FrameRing",
+]
+
+
+_BANDS = {"RGBA": 4, "L": 1}
+
+
+class FrameRing:
+    """
+    `slots` preallocated frames of the size and mode given by `settings`
+    """
+
+    def __init__(self, settings: PilSettings, slots: int, mp_context: BaseContext):
+        if slots < 1:
+            raise ValueError(f"A ring needs at least one slot, got {slots}")
+        self.settings = settings
+        self.slots = slots
+        self.frame_size = settings.width * settings.height * _BANDS[settings.mode]
+        self._memory = SharedMemory(create=True, size=self.frame_size * slots)
+        self._free: Any = mp_context.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        # contexts and scratch images are created lazily, so each process gets its own
+        self._contexts: dict[int, PilContext] = {}
+        self._pool: Optional[CanvasPool] = None
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """
+        Wait for a free slot and take it
+        """
+        return self._free.get(timeout=timeout)
+
+    def release(self, slot: int):
+        """
+        Give a slot back after its frame has been consumed
+        """
+        self._free.put(slot)
+
+    def context(self, slot: int) -> PilContext:
+        """
+        Context drawing straight into the memory of a slot. It's created
+        once per slot in each process and reused afterwards.
+        """
+        ctx = self._contexts.get(slot)
+        if ctx is None:
+            if self._pool is None:
+                self._pool = CanvasPool(self.settings)
+            ctx = self.settings.make_ctx(self.image(slot), self._pool)
+            self._contexts[slot] = ctx
+        return ctx
+
+    def image(self, slot: int) -> Image.Image:
+        """
+        Image backed by the memory of a slot, without copying it
+        """
+        start = slot * self.frame_size
+        buffer = self._memory.buf[start:start + self.frame_size]
+        mode = self.settings.mode
+        img = Image.frombuffer(mode, (self.settings.width, self.settings.height), buffer, "raw", mode, 0, 1)
+        # otherwise PIL copies the pixels on the first write
+        img.readonly = 0
+        return img
+
+    def close(self, unlink: bool = False):
+        """
+        Detach from the shared memory. The process that created the ring
+        should also `unlink` it when all the workers are done.
+        """
+        self._contexts.clear()
+        self._memory.close()
+        if unlink:
+            self._memory.unlink()
@@ -11,18 +11,28 @@ import random
 import shutil
 from typing import Callable, Iterable, TypeVar
 
+from lanim import tools
+
 
 A = TypeVar("A")
 
 
-def run_latex_process(input_file: Path, output_dir: Path) -> Path:
+DEFAULT_DPI = 1280
+"Resolution at which LaTeX is rendered, unless specified otherwise"
+
+
+def run_latex_process(input_file: Path, output_dir: Path, dpi: int = DEFAULT_DPI) -> Path:
     """
     Invoke `pdflatex` and `dvipng` on a LaTeX document
     and return the path of the resulting PNG file.
 
     - `input_file`: path to a LaTeX document to render
     - `output_dir`: directory where to place the output
+    - `dpi`: resolution of the resulting image
     """
+    tools.require("pdflatex", "render LaTeX to DVI")
+    tools.require("dvipng", "convert DVI to PNG")
+
     cmd_pdflatex = [
         "pdflatex",
         "-draftmode", # lower quality + produces only DVI, not PDF
@@ -42,7 +52,7 @@ def run_latex_process(input_file: Path, output_dir: Path) -> Path:
         str(output_dir / input_file.name.replace(".tex", ".dvi")),
         "-fg", "rgb 1.0 1.0 1.0",
         "-bg", "Transparent",
-        "-D", "1280", # DPI
+        "-D", str(dpi),
         "-o", str(output_png_file.absolute())
     ]
     p2 = subprocess.run(cmd_dvipng, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -64,11 +74,17 @@ R"""
 """
 
 
-def render_latex_to_png(source: str, packages: Iterable[str], callback: Callable[[Path], A]) -> A:
+def render_latex_to_png(
+    source: str,
+    packages: Iterable[str],
+    callback: Callable[[Path], A],
+    dpi: int = DEFAULT_DPI,
+) -> A:
     r"""
     - `source`: LaTeX content to put between \begin{document} and \end{document}
     - `packages`: Packages to include with \usepackage{...}
     - `callback`: Function to call when the PNG file is ready
+    - `dpi`: Resolution of the image
 
     After `callback` is called, the file will not be accessible.
     """
@@ -81,7 +97,7 @@ def render_latex_to_png(source: str, packages: Iterable[str], callback: Callable
         out_path = tempdir / "out"
         in_path.write_text(content, "utf-8")
         out_path.mkdir()
-        output_file_path = run_latex_process(in_path, out_path)
+        output_file_path = run_latex_process(in_path, out_path, dpi)
         a = callback(output_file_path)
     return a
 
@@ -0,0 +1,139 @@
+"""
+Combine pieces of a video rendered separately (for example, on different
+machines with `--shard K/N`) into a single file.
+
+Usage:
+```
+python -m lanim.merge -o video.mp4 part1.mp4 part2.mp4 part3.mp4
+```
+
+Each piece is accompanied by a `<piece>.shard.json` manifest describing
+which frames it contains. Before stitching the pieces, the manifests are
+checked to make sure that every frame is present exactly once.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import asdict, dataclass
+import json
+import pathlib
+import subprocess
+import tempfile
+from typing import Sequence
+
+
+__all__ = [
+    "ShardManifest",
+    "manifest_path",
+    "check_coverage",
+    "merge_videos",
+]
+
+
+@dataclass(frozen=True)
+class ShardManifest:
+    """
+    Description of a piece of a video containing frames from `start`
+    up to, but not including, `stop`
+    """
+    module: str
+    export_name: str
+    width: int
+    height: int
+    fps: int
+    total_frames: int
+    start: int
+    stop: int
+
+    def write(self, path: pathlib.Path):
+        path.write_text(json.dumps(asdict(self), indent=2), "utf-8")
+
+    @classmethod
+    def read(cls, path: pathlib.Path) -> ShardManifest:
+        return cls(**json.loads(path.read_text("utf-8")))
+
+
+def manifest_path(video: pathlib.Path) -> pathlib.Path:
+    """
+    Where the manifest of a piece of a video is stored
+    """
+    return video.with_name(video.name + ".shard.json")
+
+
+def check_coverage(manifests: Sequence[ShardManifest]) -> list[ShardManifest]:
+    """
+    Make sure that the pieces belong to the same video and contain each
+    of its frames exactly once. Return the pieces in the order of frames.
+    """
+    if not manifests:
+        raise ValueError("No pieces to merge")
+
+    first = manifests[0]
+    for manifest in manifests:
+        if (manifest.module, manifest.export_name, manifest.width, manifest.height,
+            manifest.fps, manifest.total_frames) != \
+           (first.module, first.export_name, first.width, first.height,
+            first.fps, first.total_frames):
+            raise ValueError(
+                "Pieces come from different renders: {!r} and {!r}"
+                .format(first, manifest)
+            )
+
+    ordered = sorted(manifests, key=lambda m: (m.start, m.stop))
+    expected = 0
+    for manifest in ordered:
+        if manifest.start > expected:
+            raise ValueError("Frames {} to {} are missing".format(expected, manifest.start - 1))
+        if manifest.start < expected:
+            raise ValueError("Frames {} to {} are rendered twice".format(manifest.start, expected - 1))
+        expected = manifest.stop
+    if expected != first.total_frames:
+        raise ValueError("Frames {} to {} are missing".format(expected, first.total_frames - 1))
+
+    return ordered
+
+
+def merge_videos(pieces: Sequence[pathlib.Path], output: pathlib.Path):
+    """
+    Check the manifests of `pieces` and concatenate them into `output`
+    without re-encoding
+    """
+    manifests = [ShardManifest.read(manifest_path(piece)) for piece in pieces]
+    check_coverage(manifests)
+    ordered = sorted(zip(manifests, pieces), key=lambda mp: mp[0].start)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        listing = pathlib.Path(tempdir) / "pieces.txt"
+        listing.write_text(
+            "".join(
+                "file '{}'\n".format(str(piece.absolute()).replace("'", r"'\''"))
+                for (_, piece) in ordered
+            ),
+            "utf-8",
+        )
+        ffmpeg_process = subprocess.Popen([
+            "ffmpeg",
+            "-y",  # overwrite the output file
+            "-f", "concat",
+            "-safe", "0",  # allow absolute paths in the listing
+            "-i", str(listing),
+            "-c", "copy",
+            str(output),
+        ])
+        if ffmpeg_process.wait() != 0:
+            raise RuntimeError("ffmpeg failed to merge the pieces")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge pieces of a video rendered separately")
+    parser.add_argument("pieces", metavar="PIECE", nargs="+", type=pathlib.Path, help="Rendered pieces")
+    parser.add_argument(
+        "-o", "--output",
+        metavar="PATH",
+        type=pathlib.Path,
+        help="Where to put the merged video",
+        required=True
+    )
+    args = parser.parse_args()
+    merge_videos(args.pieces, args.output)
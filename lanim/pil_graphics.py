@@ -1,19 +1,25 @@
 from __future__ import annotations
 
 from lanim.pil_types import *
+from lanim.pil_types import _numpy
 
 import math
-from typing import Any, Callable, Iterable, Protocol, TYPE_CHECKING, Union, TypeVar
+from typing import Any, Callable, Generic, Iterable, Protocol, Sequence, TYPE_CHECKING, Union, TypeVar
 from lanim.core import Animation, Projector, ease_p, par_a_longest, par_a_shortest, seq_a
 from lanim import easings
+from lanim.rope import Rope
 
 __all__ = (
     "moved_to",
     "morph_into",
+    "MorphPlan",
     "move_by",
     "scale",
     "align",
     "Trajectory",
+    "BoundTrajectory",
+    "PrecompiledTrajectory",
+    "bind_t",
     "ease_t",
     "move_t",
     "proj_t",
@@ -69,7 +75,113 @@ def morph_into(source: PX, destination: PX) -> Animation[PX]:
     """
     Create a second-long animation of one object morphing into the other
     """
-    return Animation(1.0, lambda t: source.morphed(destination, t))
+    return Animation(1.0, MorphPlan(source, destination))
+
+
+_NUMPY_THRESHOLD = 256
+"From how many numbers on, morph plans interpolate with NumPy (if it's installed)"
+
+
+_Builder = Callable[[Sequence[float], float], Any]
+
+
+class MorphPlan(Generic[PX]):
+    """
+    Projector morphing `source` into `destination`, equivalent to
+    `lambda t: source.morphed(destination, t)`.
+
+    Instead of walking both trees on every frame, the numeric fields of
+    the known primitives are collected into two flat lists of start and end
+    values once. Each frame is then one interpolation of the lists and
+    a rebuild of the tree from a precompiled template. Parts that can't be
+    interpolated field by field, like a `Sum` switching between its sides,
+    fall back to calling `morphed` on every frame.
+    """
+
+    def __init__(self, source: PX, destination: PX):
+        self._starts: list[float] = []
+        self._ends: list[float] = []
+        self._build: _Builder = self._compile(source, destination)
+        self._vector: Callable[[float], Sequence[float]] = self._lerp_lists
+        if len(self._starts) > _NUMPY_THRESHOLD:
+            try:
+                import numpy
+            except ImportError:
+                pass
+            else:
+                self._starts_array = numpy.array(self._starts)
+                self._ends_array = numpy.array(self._ends)
+                self._vector = self._lerp_arrays
+
+    def __call__(self, t: float) -> PX:
+        return self._build(self._vector(t), t)
+
+    def _lerp_lists(self, t: float) -> Sequence[float]:
+        return [a * (1 - t) + b * t for (a, b) in zip(self._starts, self._ends)]
+
+    def _lerp_arrays(self, t: float) -> Sequence[float]:
+        return (self._starts_array * (1 - t) + self._ends_array * t).tolist()
+
+    def _fields(self, source: object, destination: object, *names: str) -> int:
+        """
+        Add fields of a pair of objects to the plan, return the offset of the first one
+        """
+        offset = len(self._starts)
+        for name in names:
+            self._starts.append(getattr(source, name))
+            self._ends.append(getattr(destination, name))
+        return offset
+
+    def _compile(self, source: Any, destination: Any) -> _Builder:
+        kind = type(source)
+        if type(destination) is not kind:
+            return _slow_path(source, destination)
+
+        if kind is Rect:
+            i = self._fields(source, destination, "x", "y", "width", "height", "line_width")
+            return lambda v, t: Rect(v[i], v[i+1], v[i+2], v[i+3], v[i+4])
+
+        if kind is Triangle:
+            i = self._fields(
+                source, destination,
+                "x", "y", "dx1", "dy1", "dx2", "dy2", "dx3", "dy3", "line_width"
+            )
+            return lambda v, t: Triangle(*v[i:i+9])
+
+        if kind is Nil:
+            i = self._fields(source, destination, "x", "y")
+            return lambda v, t: Nil(v[i], v[i+1])
+
+        if kind is Latex:
+            i = self._fields(source, destination, "x", "y", "scale_factor")
+            self._fields(source.align, destination.align, "dx", "dy")
+            text, packages = destination.source, destination.packages
+            return lambda v, t: Latex(v[i], v[i+1], text, v[i+2], Align(v[i+3], v[i+4]), packages)
+
+        if kind is Pair:
+            build_p = self._compile(source.p, destination.p)
+            build_q = self._compile(source.q, destination.q)
+            return lambda v, t: Pair(build_p(v, t), build_q(v, t))
+
+        if kind is Group and len(source.items) == len(destination.items):
+            builders = [self._compile(a, b) for (a, b) in zip(source.items, destination.items)]
+            return lambda v, t: Group([build(v, t) for build in builders])
+
+        if kind is Transform:
+            build_child = self._compile(source.child, destination.child)
+            i = self._fields(source, destination, "dx", "dy", "scale")
+            return lambda v, t: Transform(build_child(v, t), v[i], v[i+1], v[i+2])
+
+        if kind is Opacity:
+            build_child = self._compile(source.child, destination.child)
+            i = self._fields(source, destination, "opacity")
+            return lambda v, t: Opacity(build_child(v, t), v[i])
+
+        return _slow_path(source, destination)
+
+
+def _slow_path(source: Any, destination: Any) -> _Builder:
+    return lambda _, t: source.morphed(destination, t)
 
 
 def move_by(obj: PX, dx: float, dy: float) -> Animation[PX]:
@@ -108,11 +220,80 @@ class Trajectory(Protocol):
         ...
 
 
+class BoundTrajectory:
+    """
+    A trajectory with fixed endpoints. Call it with a single `t`, or use
+    `many` to get the arrays of `x` and `y` for an array of moments.
+    """
+
+    __slots__ = ("scalar", "vector")
+
+    def __init__(
+        self,
+        scalar: Callable[[float], tuple[float, float]],
+        vector: Callable[[Any, Any], tuple[Any, Any]],
+    ):
+        self.scalar = scalar
+        self.vector = vector
+
+    def __call__(self, t: float) -> tuple[float, float]:
+        return self.scalar(t)
+
+    def many(self, ts: Any) -> tuple[Any, Any]:
+        np = _numpy()
+        return self.vector(np, np.asarray(ts, dtype=float))
+
+
+class PrecompiledTrajectory:
+    """
+    A trajectory that computes everything depending only on the endpoints
+    once, in `bind`, rather than on every call
+    """
+
+    __slots__ = ("bind",)
+
+    def __init__(self, bind: Callable[[float, float, float, float], BoundTrajectory]):
+        self.bind = bind
+
+    def __call__(self, x1: float, y1: float, x2: float, y2: float, t: float) -> tuple[float, float]:
+        return self.bind(x1, y1, x2, y2)(t)
+
+
+def bind_t(traj: Trajectory, x1: float, y1: float, x2: float, y2: float) -> BoundTrajectory:
+    """
+    Fix the endpoints of a trajectory. Trajectories that aren't
+    precompiled are called once per moment by `many`.
+    """
+    if isinstance(traj, PrecompiledTrajectory):
+        return traj.bind(x1, y1, x2, y2)
+
+    def scalar(t: float) -> tuple[float, float]:
+        return traj(x1, y1, x2, y2, t)
+
+    def vector(np: Any, ts: Any) -> tuple[Any, Any]:
+        points = [traj(x1, y1, x2, y2, t) for t in ts.flat]
+        xs = np.array([x for (x, _) in points], dtype=float).reshape(ts.shape)
+        ys = np.array([y for (_, y) in points], dtype=float).reshape(ts.shape)
+        return (xs, ys)
+
+    return BoundTrajectory(scalar, vector)
+
+
 def ease_t(traj: Trajectory, easing: easings.Easing) -> Trajectory:
     """
     Apply an easing to a trajectory
     """
-    return lambda x1, y1, x2, y2, t: traj(x1, y1, x2, y2, easing(t))
+    if not isinstance(traj, PrecompiledTrajectory):
+        return lambda x1, y1, x2, y2, t: traj(x1, y1, x2, y2, easing(t))
+
+    def bind(x1: float, y1: float, x2: float, y2: float) -> BoundTrajectory:
+        path = traj.bind(x1, y1, x2, y2)
+        f = getattr(easing, "scalar", easing)
+        return BoundTrajectory(
+            lambda t: path.scalar(f(t)),
+            lambda np, ts: path.vector(np, easings.sample(easing, ts)),
+        )
+    return PrecompiledTrajectory(bind)
 
 
 def move_t(obj: PX, dest_x: float, dest_y: float, traj: Trajectory) -> Animation[PX]:
@@ -124,17 +305,19 @@ def move_t(obj: PX, dest_x: float, dest_y: float, traj: Trajectory) -> Animation
 
 
 def proj_t(obj: PX, dest_x: float, dest_y: float, traj: Trajectory) -> Projector[PX]:
+    path = bind_t(traj, obj.x, obj.y, dest_x, dest_y).scalar
     def projector(t: float) -> PX:
-        x, y  = traj(obj.x, obj.y, dest_x, dest_y, t)
+        x, y  = path(t)
         return obj.moved(x - obj.x, y - obj.y)
     return projector
 
 
-linear_traj: Trajectory = \
-    lambda x1, y1, x2, y2, t: (
-        x1 * (1 - t) + x2 * t,
-        y1 * (1 - t) + y2 * t,
+def _bind_linear(x1: float, y1: float, x2: float, y2: float) -> BoundTrajectory:
+    return BoundTrajectory(
+        lambda t: (x1 * (1 - t) + x2 * t, y1 * (1 - t) + y2 * t),
+        lambda np, ts: (x1 * (1 - ts) + x2 * ts, y1 * (1 - ts) + y2 * ts),
     )
+linear_traj: Trajectory = PrecompiledTrajectory(_bind_linear)
 
 
 def normal(x1: float, y1: float, x2: float, y2: float) -> tuple[float, float]:
@@ -157,33 +340,64 @@ def make_arc_traj(distancing_function: Callable[[float], float]) -> Trajectory:
     (x1,y1)              (x2,y2)
       t=0       t=0.5      t=1
     ```
+
+    The distancing function is evaluated like an easing, so if it's an
+    [`easings.VectorEasing`][lanim.easings.VectorEasing], the arc can
+    be sampled in bulk without a Python loop.
     """
-    def _traj(x1: float, y1: float, x2: float, y2: float, t: float) -> tuple[float, float]:
+    def bind(x1: float, y1: float, x2: float, y2: float) -> BoundTrajectory:
         nx, ny = normal(x1, y1, x2, y2)
-        lx, ly = linear_traj(x1, y1, x2, y2, t)
-        arm = distancing_function(t) * math.sqrt((x2 - x1)**2 + (y2 - y1)**2) / 2
-        mx, my = lx + arm*nx, ly + arm*ny
-        return (mx, my)
-    return _traj
-halfcircle_traj: Trajectory = make_arc_traj(lambda t: math.sqrt(1 - (2*t - 1)**2))
-low_arc_traj: Trajectory = make_arc_traj(lambda t: t*(1 - t)*2)
+        half_length = math.sqrt((x2 - x1)**2 + (y2 - y1)**2) / 2
+        d = getattr(distancing_function, "scalar", distancing_function)
+
+        def scalar(t: float) -> tuple[float, float]:
+            arm = d(t) * half_length
+            return (x1 * (1 - t) + x2 * t + arm*nx, y1 * (1 - t) + y2 * t + arm*ny)
+
+        def vector(np: Any, ts: Any) -> tuple[Any, Any]:
+            arms = easings.sample(distancing_function, ts) * half_length
+            return (x1 * (1 - ts) + x2 * ts + arms*nx, y1 * (1 - ts) + y2 * ts + arms*ny)
+
+        return BoundTrajectory(scalar, vector)
+    return PrecompiledTrajectory(bind)
+halfcircle_traj: Trajectory = make_arc_traj(easings.VectorEasing(
+    lambda t: math.sqrt(1 - (2*t - 1)**2),
+    lambda np, t: np.sqrt(1 - (2*t - 1)**2),
+))
+low_arc_traj: Trajectory = make_arc_traj(easings.VectorEasing(
+    lambda t: t*(1 - t)*2,
+    lambda np, t: t*(1 - t)*2,
+))
 
 
 def lift_traj(height: float) -> Trajectory:
     """
     Lift the trajectory up by `height` units
     """
-    def traj(x1: float, y1: float, x2: float, y2: float, t: float):
-        if t < 0.25:
-            k = t * 4
-            return (x1, y1 - height * k)
-        elif t < 0.75:
-            k = 2 * (t - 0.25)
-            return (x1 * (1 - k) + x2 * k, y1 - height)
-        else:
-            k = 4 * (t - 0.75)
-            return (x2, (y1 - height) * (1 - k) + y2 * k)
-    return traj
+    def bind(x1: float, y1: float, x2: float, y2: float) -> BoundTrajectory:
+        top = y1 - height
+
+        def scalar(t: float) -> tuple[float, float]:
+            if t < 0.25:
+                k = t * 4
+                return (x1, y1 - height * k)
+            elif t < 0.75:
+                k = 2 * (t - 0.25)
+                return (x1 * (1 - k) + x2 * k, top)
+            else:
+                k = 4 * (t - 0.75)
+                return (x2, top * (1 - k) + y2 * k)
+
+        def vector(np: Any, ts: Any) -> tuple[Any, Any]:
+            rising, moving = ts < 0.25, ts < 0.75
+            k_across = 2 * (ts - 0.25)
+            k_down = 4 * (ts - 0.75)
+            xs = np.where(rising, x1, np.where(moving, x1 * (1 - k_across) + x2 * k_across, x2))
+            ys = np.where(rising, y1 - height * (ts * 4), np.where(moving, top, top * (1 - k_down) + y2 * k_down))
+            return (xs, ys)
+
+        return BoundTrajectory(scalar, vector)
+    return PrecompiledTrajectory(bind)
 
 
 # Pair-related functions:
@@ -233,19 +447,19 @@ def gforeground(bg: Animation[P], fg: Iterable[Q]) -> Animation[Pair[P, Group[Q]
 
 
 def group_join(g: Group[Group[N]]) -> Group[N]:
-    items: list[N] = []
+    items: Rope[N] = Rope()
     for subg in g.items:
-        items.extend(subg.items)
+        items = items.concat(subg.items)
     return Group(items)
 
 
 def mixed_group_join(g: Group[Union[N, Group[N]]]) -> Group[N]:
-    items: list[N] = []
+    items: Rope[N] = Rope()
     for item in g.items:
         if isinstance(item, Group):
-            items.extend(item.items)
+            items = items.concat(item.items)
         else:
-            items.append(item)
+            items = items.append(item)
     return Group(items)
 
 
@@ -1,12 +1,48 @@
 from __future__ import annotations
 
 
-from typing import Iterable
+from dataclasses import dataclass
+from io import BytesIO
+import math
+import multiprocessing
+import queue
+from threading import Event, Thread
+import traceback
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, TYPE_CHECKING, TypeVar
 from pathlib import Path
-from threading import Thread
 import time
-from lanim.core import Animation, frames
-from lanim.pil_types import PilRenderable, PilSettings
+from PIL import Image, ImageDraw
+from lanim.core import Animation, frame_count, frame_progress
+from lanim.latex import DEFAULT_DPI
+from lanim.pil_types import CanvasPool, PilContext, PilRenderable, PilSettings
+from lanim.pipeline import Stage, StageStats, run_pipeline, zip_stage
+
+if TYPE_CHECKING:
+    # shared memory is only needed for rendering in processes
+    from lanim.frame_ring import FrameRing
+
+
+A = TypeVar("A")
+B = TypeVar("B")
+
+
+@dataclass(frozen=True)
+class Variant:
+    """
+    An extra resolution rendered in the same pass as the main one
+    """
+
+    width: int
+    height: int
+
+    path: Path
+    "Where to put the `frame_N.png` files of this variant"
+
+    downscale: bool = False
+    """
+    Resize the main frames instead of drawing the scene tree again at this
+    size. This is faster, but thin lines and text get blurrier.
+    """
 
 
 def render_pil(
@@ -15,45 +51,457 @@ def render_pil(
     animation: Animation[PilRenderable],
     path: Path,
     fps: float,
-    workers: int
+    workers: int,
+    queue_size: Optional[int] = None,
+    eval_workers: int = 1,
+    encode_workers: Optional[int] = None,
+    frame_numbers: Optional[Sequence[int]] = None,
+    draft: bool = False,
+    time_budget: Optional[float] = None,
+    mono: bool = False,
+    processes: int = 0,
+    stats: Optional[list[StageStats]] = None,
+    variants: Sequence[Variant] = (),
+    progress: Optional[Callable[[int], None]] = None,
 ):
+    """
+    Render an animation as a series of `frame_N.png` files in `path`.
+
+    Rendering is split into four stages, each running on its own threads:
+
+    1. evaluating the scene tree of a frame (`eval_workers` threads)
+    2. rasterizing it into an image (`workers` threads)
+    3. compressing the image as PNG (`encode_workers` threads, defaults to `workers`)
+    4. writing the file
+
+    Frames are computed lazily, and at most `queue_size` frames (by default,
+    two per rasterizing worker) wait in front of each stage, so only a few
+    scene trees and images are alive at any time.
+
+    If `frame_numbers` is given, only those frames are rendered. They keep the
+    numbers they would have in a full render, so several renders of different
+    frames can be combined later.
+
+    With `draft` set, quality is traded for speed (see
+    [`default_settings`][lanim.pil_machinery.default_settings]). With a
+    `time_budget` (in seconds), no new frames are started after the time is
+    up, so only the beginning of the animation may get rendered.
+
+    With `mono` set, frames are drawn and saved as 8-bit grayscale images.
+
+    With `processes` set, the first two stages run in that many forked
+    processes instead of threads, so drawing isn't limited by the GIL.
+    The processes draw into a [`FrameRing`][lanim.frame_ring.FrameRing]
+    in shared memory, and the frames are encoded from there without copying.
+
+    Every [`Variant`][lanim.pil_machinery.Variant] is rendered at its own
+    size from the same scene trees, so the animation is only evaluated once
+    for all the resolutions. This doesn't work together with `processes`.
+
+    `progress` is called with the number of each frame once it's saved.
+
+    The statistics of each stage are printed, and also added to `stats`
+    if it's given. The time it took to render the frames is returned.
+    """
+    if variants and processes > 0:
+        raise ValueError("Variants can't be rendered in processes yet")
     path.mkdir(parents=True, exist_ok=True)
+    for variant in variants:
+        variant.path.mkdir(parents=True, exist_ok=True)
+
+    settings = default_settings(width, height, draft, mono)
+
+    print(f"Size: {width}x{height}, duration: {animation.duration}s @{fps}FPS")
+    for variant in variants:
+        print(f"Variant: {variant.width}x{variant.height}{' (downscaled)' if variant.downscale else ''}")
+    if frame_numbers is None:
+        frame_numbers = range(frame_count(animation, fps))
+
+    t1 = time.time()
+    source = ((i, i) for i in frame_numbers)
+    if time_budget is not None:
+        source = _until(source, t1 + time_budget)
+
+    if processes > 0:
+        print(f"Launching {processes} processes and {encode_workers or workers} encoding threads")
+        stage_stats = _render_in_processes(
+            animation, settings, fps, path, source, processes,
+            encode_workers or workers, queue_size or 2 * processes, progress,
+        )
+    elif variants:
+        print(f"Launching {workers} threads")
+        outputs = [(settings, False), *(
+            (default_settings(v.width, v.height, draft, mono), v.downscale) for v in variants
+        )]
+        # resized frames are allocated by PIL, so they don't come from a pool
+        pools = [None if downscale else CanvasPool(s) for (s, downscale) in outputs]
+        stages = [
+            evaluate_stage(animation, fps, eval_workers),
+            rasterize_variants_stage(outputs, workers, pools),
+            zip_stage("encode", [encode_stage(pool=pool) for pool in pools], encode_workers or workers),
+            zip_stage("write", [
+                png_sink_stage(path, progress=progress),
+                *(png_sink_stage(v.path) for v in variants),
+            ]),
+        ]
+        stage_stats = run_pipeline(source, stages, queue_size=queue_size or 2 * workers)
+    else:
+        print(f"Launching {workers} threads")
+        pool = CanvasPool(settings)
+        stages = [
+            evaluate_stage(animation, fps, eval_workers),
+            rasterize_stage(settings, workers, pool),
+            encode_stage(encode_workers or workers, pool),
+            png_sink_stage(path, progress=progress),
+        ]
+        stage_stats = run_pipeline(source, stages, queue_size=queue_size or 2 * workers)
+        print(f"Canvas pool: {pool.allocated} images allocated, at most {pool.high_water} in use")
+    t2 = time.time()
+
+    _print_stats(stage_stats)
+    if stats is not None:
+        stats.extend(stage_stats)
+    return t2 - t1
+
+
+def render_frame(animation: Animation[PilRenderable], t: float, settings: PilSettings) -> Image.Image:
+    """
+    Draw the frame of an animation at `t` seconds from its start. Only
+    that moment is evaluated, so it takes as long as a single frame of
+    a full render.
+    """
+    ctx = settings.make_ctx()
+    _render_frame(ctx, animation.projector(_progress_at(animation, t)))
+    return ctx.img
+
+
+def render_frames(
+    animation: Animation[PilRenderable],
+    times: Sequence[float],
+    settings: PilSettings,
+    workers: int = 1,
+) -> list[Image.Image]:
+    """
+    Draw the frames at several moments (in seconds) in parallel, returning
+    them in the same order as `times`
+    """
+    images: list[Optional[Image.Image]] = [None] * len(times)
+    def make_collector() -> Callable[[int, Image.Image], None]:
+        return images.__setitem__
+    stages = [
+        Stage("evaluate", lambda: lambda _, t: animation.projector(_progress_at(animation, t))),
+        rasterize_stage(settings, workers),
+        Stage("collect", make_collector),
+    ]
+    run_pipeline(enumerate(times), stages, queue_size=2 * workers)
+    return images  # type: ignore
+
+
+def contact_sheet(
+    images: Sequence[Image.Image],
+    columns: Optional[int] = None,
+    labels: Optional[Sequence[str]] = None,
+    gap: int = 4,
+) -> Image.Image:
+    """
+    Lay out images of the same size in a grid, by default as square as
+    possible, optionally writing a label in the corner of each one
+    """
+    if not images:
+        raise ValueError("No images for the contact sheet")
+    columns = columns or math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    (width, height) = images[0].size
+    sheet = Image.new(
+        images[0].mode,
+        (columns * width + (columns - 1) * gap, rows * height + (rows - 1) * gap),
+        "gray",
+    )
+    draw = ImageDraw.Draw(sheet)
+    for (i, img) in enumerate(images):
+        (row, column) = divmod(i, columns)
+        x, y = column * (width + gap), row * (height + gap)
+        sheet.paste(img, (x, y))
+        if labels is not None:
+            draw.text((x + 4, y + 2), labels[i], fill="white")
+    return sheet
+
+
+def _progress_at(animation: Animation[A], t: float) -> float:
+    if animation.duration <= 0:
+        return 0.0
+    return min(1.0, max(0.0, t / animation.duration))
 
-    settings = PilSettings(
+
+def _until(source: Iterable[A], deadline: float) -> Iterator[A]:
+    for item in source:
+        if time.time() > deadline:
+            print("Out of time, stopping early")
+            return
+        yield item
+
+
+DRAFT_LATEX_DPI = 320
+"Resolution at which LaTeX is rendered in draft mode"
+
+
+def default_settings(width: int, height: int, draft: bool = False, mono: bool = False) -> PilSettings:
+    """
+    Settings for a viewport 16 units wide, with the origin in the center.
+
+    In `draft` mode, LaTeX is rendered at a lower resolution and
+    semi-transparent objects are faded with a plain alpha, without blending
+    them through intermediate images.
+    In `mono` mode, frames are grayscale (`"L"`) images.
+    """
+    return PilSettings(
         width=width, height=height,
         center_x=width//2, center_y=height//2,
-        unit=width//16
+        unit=width//16,
+        latex_dpi=DRAFT_LATEX_DPI if draft else DEFAULT_DPI,
+        draft=draft,
+        mode="L" if mono else "RGBA",
     )
 
-    print(f"Size: {width}x{height}, duration: {animation.duration}s @{fps}FPS")
-    print(f"Launching {workers} threads")
 
-    jobs = [[] for _ in range(workers)]
+def _print_stats(stats: list[StageStats]):
+    for stage in stats:
+        print(
+            f"{stage.name}: {stage.items} frames, {stage.busy:.2f}s busy, "
+            f"{stage.per_item() * 1000:.1f}ms per frame"
+        )
 
-    for (i, frame) in enumerate(frames(animation, fps)):
-        jobs[i % workers].append((i, frame))
 
-    frame_rendering_threads: list[Thread] = []
+# Stages of the rendering pipeline. They can be used on their own,
+# for example with `lanim.pipeline.benchmark_stage`.
 
-    t1 = time.time()
+def evaluate_stage(animation: Animation[PilRenderable], fps: float, workers: int = 1) -> Stage[int, PilRenderable]:
+    """
+    Stage computing the scene tree of the frame with a given number
+    """
+    def make_worker() -> Callable[[int, int], PilRenderable]:
+        return lambda _, frame: animation.projector(frame_progress(animation, fps, frame))
+    return Stage("evaluate", make_worker, workers)
 
-    for (n, job) in enumerate(jobs):
-        print(f"Starting job {n} with {len(job)} frames...")
-        thread = Thread(target=_render_frames, args=(job, settings, path))
-        thread.start()
-        frame_rendering_threads.append(thread)
 
-    for (n, thread) in enumerate(frame_rendering_threads):
-        print(f"Waiting for frame-job {n}...")
-        thread.join()
+def rasterize_stage(
+    settings: PilSettings,
+    workers: int = 1,
+    pool: Optional[CanvasPool] = None,
+) -> Stage[PilRenderable, Image.Image]:
+    """
+    Stage drawing a scene tree onto a new image.
 
-    t2 = time.time()
-    return t2 - t1
+    With a `pool`, the frames and the scratch images are borrowed from it
+    instead of being allocated, and the frames should be given back by a
+    later stage, like [`encode_stage`][lanim.pil_machinery.encode_stage]
+    with the same pool.
+    """
+    def make_worker() -> Callable[[int, PilRenderable], Image.Image]:
+        if pool is not None:
+            def rasterize_pooled(_: int, frame: PilRenderable) -> Image.Image:
+                img = pool.borrow()
+                _render_frame(settings.make_ctx(img, pool), frame)
+                return img
+            return rasterize_pooled
 
+        ctx = settings.make_ctx()
+        def rasterize(_: int, frame: PilRenderable) -> Image.Image:
+            _render_frame(ctx, frame)
+            return ctx.img.copy()
+        return rasterize
+    return Stage("rasterize", make_worker, workers)
 
-def _render_frames(frames: Iterable[tuple[int, PilRenderable]], settings: PilSettings, path: Path):
-    ctx = settings.make_ctx()
-    for (position, frame) in frames:
-        ctx.draw.rectangle((0, 0) + ctx.img.size, fill=(0, 0, 0, 255))  # type: ignore -- bad PIL stubs
-        frame.render_pil(ctx)
-        ctx.img.save(path / f"frame_{position}.png")
+
+def rasterize_variants_stage(
+    outputs: Sequence[tuple[PilSettings, bool]],
+    workers: int = 1,
+    pools: Optional[Sequence[Optional[CanvasPool]]] = None,
+) -> Stage[PilRenderable, tuple[Image.Image, ...]]:
+    """
+    Stage drawing a scene tree at several resolutions. `outputs` are pairs
+    of settings and whether to resize the first image instead of drawing
+    the scene again, which the first output can't do. `pools` work like in
+    [`rasterize_stage`][lanim.pil_machinery.rasterize_stage], one per output.
+    """
+    if not outputs or outputs[0][1]:
+        raise ValueError("The first output has to be drawn, not downscaled")
+    pools = pools or [None] * len(outputs)
+
+    def make_worker() -> Callable[[int, PilRenderable], tuple[Image.Image, ...]]:
+        draw = [
+            None if downscale else rasterize_stage(settings, pool=pool).make_worker()
+            for ((settings, downscale), pool) in zip(outputs, pools)
+        ]
+        def rasterize(index: int, frame: PilRenderable) -> tuple[Image.Image, ...]:
+            images: list[Image.Image] = []
+            for ((settings, _), f) in zip(outputs, draw):
+                if f is not None:
+                    images.append(f(index, frame))
+                else:
+                    images.append(images[0].resize((settings.width, settings.height), Image.LANCZOS))
+            return tuple(images)
+        return rasterize
+    return Stage("rasterize", make_worker, workers)
+
+
+def encode_stage(workers: int = 1, pool: Optional[CanvasPool] = None) -> Stage[Image.Image, bytes]:
+    """
+    Stage compressing an image as PNG. If the image comes from
+    a `pool`, it's given back afterwards.
+    """
+    def make_worker() -> Callable[[int, Image.Image], bytes]:
+        def encode(_: int, img: Image.Image) -> bytes:
+            buffer = BytesIO()
+            img.save(buffer, format="PNG")
+            if pool is not None:
+                pool.give_back(img)
+            return buffer.getvalue()
+        return encode
+    return Stage("encode", make_worker, workers)
+
+
+def png_sink_stage(
+    path: Path,
+    workers: int = 1,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Stage[bytes, None]:
+    """
+    Stage saving encoded frames as `frame_N.png` files in `path`,
+    calling `progress` with the number of each saved frame
+    """
+    def make_worker() -> Callable[[int, bytes], None]:
+        def write(position: int, data: bytes) -> None:
+            (path / f"frame_{position}.png").write_bytes(data)
+            if progress is not None:
+                progress(position)
+        return write
+    return Stage("write", make_worker, workers)
+
+
+# Rendering in processes:
+
+def _render_in_processes(
+    animation: Animation[PilRenderable],
+    settings: PilSettings,
+    fps: float,
+    path: Path,
+    source: Iterable[tuple[int, int]],
+    processes: int,
+    encode_workers: int,
+    slots: int,
+    progress: Optional[Callable[[int], None]] = None,
+) -> list[StageStats]:
+    try:
+        mp = multiprocessing.get_context("fork")
+    except ValueError:
+        raise RuntimeError("Rendering in processes needs the 'fork' start method, which this OS lacks") from None
+
+    from lanim.frame_ring import FrameRing
+
+    ring = FrameRing(settings, slots, mp)
+    tasks: Any = mp.Queue()
+    done: Any = mp.Queue()
+    # `fork` lets the workers inherit the animation without pickling it
+    workers = [
+        mp.Process(target=_process_worker, args=(animation, fps, ring, tasks, done), daemon=True)
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def feed():
+        for (_, frame) in source:
+            tasks.put(frame)
+        for _ in workers:
+            tasks.put(None)
+    Thread(target=feed, daemon=True).start()
+
+    render_stats = StageStats("evaluate+rasterize")
+    failed = Event()
+
+    def collect() -> Iterator[tuple[int, int]]:
+        running = len(workers)
+        while running and not failed.is_set():
+            try:
+                message = done.get(timeout=1.0)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("Rendering processes died unexpectedly")
+                continue
+            kind, *args = message
+            if kind == "frame":
+                index, slot, busy = args
+                render_stats.items += 1
+                render_stats.busy += busy
+                yield (index, slot)
+            elif kind == "error":
+                raise RuntimeError(f"A rendering process failed:\n{args[0]}")
+            else:
+                running -= 1
+
+    stages = [
+        _flag_errors(ring_encode_stage(ring, encode_workers), failed),
+        _flag_errors(png_sink_stage(path, progress=progress), failed),
+    ]
+    try:
+        stats = run_pipeline(collect(), stages, queue_size=slots)
+    finally:
+        for worker in workers:
+            worker.kill()
+            worker.join()
+        ring.close(unlink=True)
+    return [render_stats, *stats]
+
+
+def _process_worker(animation: Animation[PilRenderable], fps: float, ring: FrameRing, tasks: Any, done: Any):
+    try:
+        for frame in iter(tasks.get, None):
+            t1 = time.perf_counter()
+            scene = animation.projector(frame_progress(animation, fps, frame))
+            slot = ring.acquire()
+            _render_frame(ring.context(slot), scene)
+            t2 = time.perf_counter()
+            done.put(("frame", frame, slot, t2 - t1))
+    except BaseException:
+        done.put(("error", traceback.format_exc()))
+    else:
+        done.put(("exit",))
+
+
+def _flag_errors(stage: Stage[A, B], failed: Event) -> Stage[A, B]:
+    """
+    Set `failed` when the stage raises an exception, so that the source can stop
+    """
+    def make_worker() -> Callable[[int, A], B]:
+        process = stage.make_worker()
+        def flagged(index: int, value: A) -> B:
+            try:
+                return process(index, value)
+            except BaseException:
+                failed.set()
+                raise
+        return flagged
+    return Stage(stage.name, make_worker, stage.workers)
+
+
+def ring_encode_stage(ring: FrameRing, workers: int = 1) -> Stage[int, bytes]:
+    """
+    Stage compressing the frame in a slot of a `FrameRing` as PNG
+    and then releasing the slot
+    """
+    def make_worker() -> Callable[[int, int], bytes]:
+        def encode(_: int, slot: int) -> bytes:
+            try:
+                buffer = BytesIO()
+                ring.image(slot).save(buffer, format="PNG")
+                return buffer.getvalue()
+            finally:
+                ring.release(slot)
+        return encode
+    return Stage("encode", make_worker, workers)
+
+
+def _render_frame(ctx: PilContext, frame: PilRenderable):
+    ctx.clear()
+    frame.render_pil(ctx)
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field, replace as dataclass_replace
+from contextlib import contextmanager
+from dataclasses import FrozenInstanceError, dataclass, field, fields, replace as dataclass_replace
+import math
+from threading import Lock
 from typing import (
-    Callable, ClassVar, Collection, Generic, Iterator, Literal, Optional,
+    Any, Callable, ClassVar, Collection, Generic, Iterable, Iterator, Literal, Optional,
     Protocol, Sequence, TYPE_CHECKING, TypeVar, Union, overload,
 )
 from PIL import Image, ImageDraw, ImageChops
+from lanim.latex import DEFAULT_DPI
 from lanim.pil_utils import render_latex_scaled
 from lanim.core import Animation, Projector, ease_p
+from lanim.rope import Rope
 from lanim import easings
+from lanim.easings import _numpy
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 __all__ = (
@@ -16,6 +25,7 @@ __all__ = (
     "Style",
     "PilSettings",
     "PilContext",
+    "CanvasPool",
 
     "PilRenderable",
     "Scalable",
@@ -23,6 +33,7 @@ __all__ = (
     "Alignable",
     "AlignableMorphable",
     "ScalableMorphable",
+    "BBox",
 
     # TypeVars:
     "A", "B", "P", "Q", "R", "R2", "R3", "PA", "PS", "QS", "RS", "RS2", "RS3",
@@ -39,10 +50,68 @@ __all__ = (
     "Select",
     "Sum",
     "Opacity",
+    "Transform",
+    "GroupArray",
 )
 
 
-@dataclass
+_T = TypeVar("_T")
+
+
+def _compact(cls: type[_T]) -> type[_T]:
+    """
+    Recreate a frozen dataclass with `__slots__` instead of a per-instance
+    `__dict__`, and with a `__hash__` that is only computed once.
+    This makes the many small objects created on every frame cheaper.
+    """
+    all_fields = fields(cls)  # type: ignore
+    names = tuple(f.name for f in all_fields)
+    state_names = tuple(f.name for f in all_fields if f.init)
+
+    namespace = dict(cls.__dict__)
+    for name in names:
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    namespace["__slots__"] = (*names, "_hash")
+
+    field_hash = cls.__hash__
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            h = field_hash(self)
+            object.__setattr__(self, "_hash", h)
+            return h
+    namespace["__hash__"] = __hash__
+
+    # pickling a frozen object with slots needs help, and the cached
+    # values are not worth transferring. Fields with `init=False` hold such
+    # cached values and are left empty until they're computed, which is why
+    # they're read with a default.
+    def __getstate__(self) -> tuple[object, ...]:
+        return tuple(getattr(self, name) for name in state_names)
+    def __setstate__(self, state: tuple[object, ...]):
+        for (name, value) in zip(state_names, state):
+            object.__setattr__(self, name, value)
+    namespace["__getstate__"] = __getstate__
+    namespace["__setstate__"] = __setstate__
+
+    # the generated methods refer to the original class
+    def __setattr__(self, name: str, value: object):
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+    def __delattr__(self, name: str):
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+    namespace["__setattr__"] = __setattr__
+    namespace["__delattr__"] = __delattr__
+
+    compact = type(cls)(cls.__name__, cls.__bases__, namespace)
+    compact.__qualname__ = cls.__qualname__
+    return compact  # type: ignore
+
+
+@_compact
+@dataclass(frozen=True)
 class Align:
     """
     Specification of the horizontal and vertical alignment
@@ -108,6 +177,7 @@ Align.LD = Align(   0,   -1)
 Align.RD = Align(  -1,   -1)
 
 
+@_compact
 @dataclass(frozen=True)
 class Style:
     """
@@ -129,10 +199,96 @@ class PilSettings:
     center_y: int
     unit: int
 
-    def make_ctx(self) -> PilContext:
-        img = Image.new("RGBA", (self.width, self.height), (0, 0, 0, 0))
+    latex_dpi: int = DEFAULT_DPI
+    "Resolution at which LaTeX is rendered before scaling"
+
+    draft: bool = False
+    "Trade quality for speed, e.g. by fading objects with a plain alpha"
+
+    camera_x: float = 0.0
+    "x-coordinate of the point shown in the center of the viewport"
+
+    camera_y: float = 0.0
+    "y-coordinate of the point shown in the center of the viewport"
+
+    zoom: float = 1.0
+    "How many times the scene is magnified"
+
+    mode: str = "RGBA"
+    """
+    Mode of the frames: `"RGBA"` for color, or `"L"` for 8-bit grayscale,
+    which takes a quarter of the memory and is faster to draw and encode
+    """
+
+    def new_image(self) -> Image.Image:
+        """
+        Transparent (or black, in grayscale mode) image of the viewport size
+        """
+        if self.mode not in ("RGBA", "L"):
+            raise ValueError(f"Unsupported mode {self.mode!r}, expected 'RGBA' or 'L'")
+        return Image.new(self.mode, (self.width, self.height), self.transparent())
+
+    def transparent(self) -> Union[int, tuple[int, int, int, int]]:
+        """
+        Color of an empty pixel
+        """
+        return (0, 0, 0, 0) if self.mode == "RGBA" else 0
+
+    def make_ctx(self, img: Optional[Image.Image] = None, pool: Optional[CanvasPool] = None) -> PilContext:
+        """
+        Context for drawing a frame. If `img` isn't given, a new image is created.
+        Scratch images are borrowed from `pool` if it's given.
+        """
+        if img is None:
+            img = self.new_image()
         draw = ImageDraw.ImageDraw(img)
-        return PilContext(self, img, draw)
+        return PilContext(
+            self, img, draw,
+            offset_x=-self.camera_x * self.zoom,
+            offset_y=-self.camera_y * self.zoom,
+            scale=self.zoom,
+            pool=pool,
+        )
+
+
+class CanvasPool:
+    """
+    Reusable images of the viewport size, so that drawing frames doesn't
+    allocate new ones all the time. Images are borrowed with `borrow` and
+    returned with `give_back`; a borrowed image is always transparent.
+
+    The pool is thread-safe, so images can be borrowed in one thread
+    and given back in another.
+    """
+
+    def __init__(self, settings: PilSettings):
+        self.settings = settings
+        self._free: list[Image.Image] = []
+        self._lock = Lock()
+        self.in_use = 0
+        "How many images are borrowed right now"
+        self.high_water = 0
+        "The largest number of images borrowed at the same time"
+
+    @property
+    def allocated(self) -> int:
+        "How many images the pool has created"
+        return self.in_use + len(self._free)
+
+    def borrow(self) -> Image.Image:
+        with self._lock:
+            img = self._free.pop() if self._free else None
+            self.in_use += 1
+            self.high_water = max(self.high_water, self.in_use)
+        if img is None:
+            return self.settings.new_image()
+        img.paste(self.settings.transparent(), (0, 0) + img.size)
+        return img
+
+    def give_back(self, img: Image.Image):
+        with self._lock:
+            self.in_use -= 1
+            self._free.append(img)
 
 
 @dataclass(frozen=True)
@@ -144,11 +300,113 @@ class PilContext:
     img: Image.Image
     draw: ImageDraw.ImageDraw
 
+    offset_x: float = 0.0
+    offset_y: float = 0.0
+    scale: float = 1.0
+    """
+    Transformation applied to the coordinates when drawing: a point
+    `(x, y)` is drawn where `(x*scale + offset_x, y*scale + offset_y)`
+    would be drawn without a transformation
+    """
+
+    pool: Optional[CanvasPool] = None
+    "Where to borrow scratch images from"
+
     def coord(self, x: float, y: float) -> tuple[int, int]:
-        pixels_x = self.settings.center_x + self.settings.unit * x
-        pixels_y = self.settings.center_y + self.settings.unit * y
+        pixels_x = self.settings.center_x + self.settings.unit * (x * self.scale + self.offset_x)
+        pixels_y = self.settings.center_y + self.settings.unit * (y * self.scale + self.offset_y)
         return round(pixels_x), round(pixels_y)
 
+    def transformed(self, dx: float, dy: float, scale: float) -> PilContext:
+        """
+        Context for drawing an object moved by `(dx, dy)` and scaled
+        `scale` times around the origin, without modifying the object
+        """
+        return dataclass_replace(
+            self,
+            offset_x=self.offset_x + dx * self.scale,
+            offset_y=self.offset_y + dy * self.scale,
+            scale=self.scale * scale,
+        )
+
+    def layer(self) -> PilContext:
+        """
+        Context with the same transformation, but a new transparent image
+        """
+        img = self.settings.new_image()
+        return dataclass_replace(self, img=img, draw=ImageDraw.ImageDraw(img))
+
+    @contextmanager
+    def scratch(self) -> Iterator[PilContext]:
+        """
+        Same as `layer`, but the image is borrowed from the pool
+        (if there is one) and given back afterwards
+        """
+        if self.pool is None:
+            yield self.layer()
+            return
+        img = self.pool.borrow()
+        try:
+            yield dataclass_replace(self, img=img, draw=ImageDraw.ImageDraw(img))
+        finally:
+            self.pool.give_back(img)
+
+    @contextmanager
+    def scratch_image(self, color: Union[int, tuple[int, ...]]) -> Iterator[Image.Image]:
+        """
+        Borrow an image filled with `color` from the pool (if there is one)
+        """
+        if self.pool is None:
+            yield Image.new(self.img.mode, self.img.size, color)
+            return
+        img = self.pool.borrow()
+        try:
+            img.paste(color, (0, 0) + img.size)
+            yield img
+        finally:
+            self.pool.give_back(img)
+
+    def visible(self, bbox: Optional[BBox]) -> bool:
+        """
+        Whether something inside `bbox` could show up in the image.
+        An unknown (`None`) bounding box is always considered visible.
+
+        The box is padded by a quarter of a unit, so that outlines drawn
+        around it aren't cut off.
+        """
+        if bbox is None:
+            return True
+        settings = self.settings
+        x1, y1, x2, y2 = bbox
+        if x2 < x1 or y2 < y1:
+            return False
+        xa = settings.center_x + settings.unit * (x1 * self.scale + self.offset_x)
+        xb = settings.center_x + settings.unit * (x2 * self.scale + self.offset_x)
+        ya = settings.center_y + settings.unit * (y1 * self.scale + self.offset_y)
+        yb = settings.center_y + settings.unit * (y2 * self.scale + self.offset_y)
+        padding = settings.unit / 4
+        width, height = self.img.size
+        return (
+            max(xa, xb) >= -padding and min(xa, xb) <= width + padding
+            and max(ya, yb) >= -padding and min(ya, yb) <= height + padding
+        )
+
+    def clear(self):
+        """
+        Fill the whole image with opaque black
+        """
+        black = (0, 0, 0, 255) if self.img.mode == "RGBA" else 0
+        self.draw.rectangle((0, 0) + self.img.size, fill=black)  # type: ignore -- bad PIL stubs
+
+    def coord_arrays(self, xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Same as `coord`, but for NumPy arrays of coordinates
+        """
+        np = _numpy()
+        pixels_x = self.settings.center_x + self.settings.unit * (xs * self.scale + self.offset_x)
+        pixels_y = self.settings.center_y + self.settings.unit * (ys * self.scale + self.offset_y)
+        return np.rint(pixels_x).astype(int), np.rint(pixels_y).astype(int)
+
     def rectangle_wh(self, cx: float, cy: float, width: float, height: float, style: Style):
         self.rectangle(cx - width/2, cy - height/2, cx + width/2, cy + height/2, style)
 
@@ -241,6 +499,53 @@ RAX2 = TypeVar("RAX2", bound=AlignableMorphable)
 RAX3 = TypeVar("RAX3", bound=AlignableMorphable)
 
 
+BBox = tuple[float, float, float, float]
+"Bounding box `(x1, y1, x2, y2)` of an object, where `x1 <= x2` and `y1 <= y2`"
+
+
+def _bbox_of(item: PilRenderable) -> Optional[BBox]:
+    """
+    Bounding box of an object, or `None` if it can't be known in advance
+    """
+    bbox = getattr(item, "bbox", None)
+    return None if bbox is None else bbox()
+
+
+def _bbox_union(bboxes: Iterable[Optional[BBox]]) -> Optional[BBox]:
+    x1 = y1 = math.inf
+    x2 = y2 = -math.inf
+    for bbox in bboxes:
+        if bbox is None:
+            return None
+        x1 = min(x1, bbox[0])
+        y1 = min(y1, bbox[1])
+        x2 = max(x2, bbox[2])
+        y2 = max(y2, bbox[3])
+    if x1 > x2:
+        return None
+    return (x1, y1, x2, y2)
+
+
+_NOT_COMPUTED: Any = object()
+
+
+def _cached(obj: object, name: str, compute: Callable[[], A]) -> A:
+    """
+    Compute a property of an immutable object once and keep it
+    in the object's `name` field
+    """
+    value = getattr(obj, name, _NOT_COMPUTED)
+    if value is _NOT_COMPUTED:
+        value = compute()
+        object.__setattr__(obj, name, value)
+    return value
+
+
+def _geometry_field() -> Any:
+    return field(default=_NOT_COMPUTED, init=False, repr=False, compare=False)
+
+
+@_compact
 @dataclass(frozen=True)
 class Rect:
     """
@@ -274,6 +579,12 @@ class Rect:
             self.line_width * (1 - t) + other.line_width * t
         )
 
+    def bbox(self) -> BBox:
+        return (
+            self.x - self.width/2, self.y - self.height/2,
+            self.x + self.width/2, self.y + self.height/2,
+        )
+
     def render_pil(self, ctx: PilContext) -> None:
         if self.width <= 0 or self.height <= 0:
             return
@@ -292,6 +603,7 @@ def _automorph(self: P, other: P, t: float, *names: str) -> P:
     return dataclass_replace(self, **kwargs)
 
 
+@_compact
 @dataclass(frozen=True)
 class Triangle:
     """
@@ -333,6 +645,11 @@ class Triangle:
             "x", "y", "dx1", "dy1", "dx2", "dy2", "dx3", "dy3", "line_width"
         )
 
+    def bbox(self) -> BBox:
+        xs = (self.x + self.dx1, self.x + self.dx2, self.x + self.dx3)
+        ys = (self.y + self.dy1, self.y + self.dy2, self.y + self.dy3)
+        return (min(xs), min(ys), max(xs), max(ys))
+
     def render_pil(self, ctx: PilContext) -> None:
         ctx.triangle(
             self.x + self.dx1,
@@ -349,6 +666,7 @@ class Triangle:
         )
 
 
+@_compact
 @dataclass(frozen=True)
 class Group(Generic[P]):
     """
@@ -359,6 +677,9 @@ class Group(Generic[P]):
 
     items: Sequence[P]
 
+    _center: tuple[float, float] = _geometry_field()
+    _bbox: Optional[BBox] = _geometry_field()
+
     if TYPE_CHECKING:
         x: float = field(init = False)
         y: float = field(init = False)
@@ -380,14 +701,37 @@ class Group(Generic[P]):
         return iter(self.items)
 
     def center(self) -> tuple[float, float]:
+        """
+        Average of the centers of the items. Computed once per group.
+        """
+        return _cached(self, "_center", self._compute_center)
+
+    def _compute_center(self) -> tuple[float, float]:
         if len(self.items) == 0:
             raise ValueError(f"Cannot find a center of an empty group, items: {self.items!r}")
         cx = sum(item.x for item in self.items)/len(self.items)
         cy = sum(item.y for item in self.items)/len(self.items)
         return (cx, cy)
 
+    def bbox(self) -> Optional[BBox]:
+        """
+        Bounding box of all the items, or `None` if some of them don't have one.
+        Computed once per group.
+        """
+        return _cached(self, "_bbox", lambda: _bbox_union(map(_bbox_of, self.items)))
+
     def moved(self, dx: float, dy: float) -> Group[P]:
-        return Group([item.moved(dx, dy) for item in self.items])
+        moved = Group([item.moved(dx, dy) for item in self.items])
+        # the geometry of the moved group is known without walking it again
+        center = getattr(self, "_center", _NOT_COMPUTED)
+        if center is not _NOT_COMPUTED:
+            cx, cy = center
+            object.__setattr__(moved, "_center", (cx + dx, cy + dy))
+        bbox = getattr(self, "_bbox", _NOT_COMPUTED)
+        if bbox is not _NOT_COMPUTED and bbox is not None:
+            x1, y1, x2, y2 = bbox
+            object.__setattr__(moved, "_bbox", (x1 + dx, y1 + dy, x2 + dx, y2 + dy))
+        return moved
 
     def scaled_about(self: Group[PS], factor: float, cx: float, cy: float) -> Group[PS]:
         return Group([item.scaled_about(factor, cx, cy) for item in self.items])
@@ -396,14 +740,20 @@ class Group(Generic[P]):
         return self.scaled_about(factor, *self.center())
 
     def add(self, new_item: Q) -> Group[Union[P, Q]]:
-        return Group([*self.items, new_item])
+        """
+        Group with one more item. The items are stored in a `Rope`,
+        so adding items one by one doesn't copy the whole group each time.
+        """
+        return Group(Rope.of(self.items).append(new_item))
 
     def concat(self, other: Group[Q]) -> Group[Union[P, Q]]:
-        return Group([*self.items, *other.items])
+        return Group(Rope.of(self.items).concat(other.items))
 
     def render_pil(self, ctx: PilContext) -> None:
+        visible = ctx.visible
         for item in self.items:
-            item.render_pil(ctx)
+            if visible(_bbox_of(item)):
+                item.render_pil(ctx)
 
 
 # The following is needed so that you can unpack a `Pair` like a tuple.
@@ -420,6 +770,7 @@ else:
     _GTuple2 = Generic
 
 
+@_compact
 @dataclass(frozen=True)
 class Pair(_GTuple2[P, Q]):
     """
@@ -430,6 +781,9 @@ class Pair(_GTuple2[P, Q]):
     p: P
     q: Q
 
+    _center: tuple[float, float] = _geometry_field()
+    _bbox: Optional[BBox] = _geometry_field()
+
     if TYPE_CHECKING:
         x: float = field(init = False)
         y: float = field(init = False)
@@ -460,7 +814,17 @@ class Pair(_GTuple2[P, Q]):
         return Pair(self.p.moved(dx, dy), self.q.moved(dx, dy))
 
     def center(self) -> tuple[float, float]:
-        return Group((self.p, self.q)).center()
+        """
+        Midpoint between the centers of _p_ and _q_. Computed once per pair.
+        """
+        return _cached(self, "_center", lambda: ((self.p.x + self.q.x)/2, (self.p.y + self.q.y)/2))
+
+    def bbox(self) -> Optional[BBox]:
+        """
+        Bounding box of _p_ and _q_, or `None` if one of them doesn't have one.
+        Computed once per pair.
+        """
+        return _cached(self, "_bbox", lambda: _bbox_union((_bbox_of(self.p), _bbox_of(self.q))))
 
     def scaled(self: Pair[PS, QS], factor: float) -> Pair[PS, QS]:
         return self.scaled_about(factor, *self.center())
@@ -475,13 +839,16 @@ class Pair(_GTuple2[P, Q]):
         return Pair[Q, P](self.q, self.p)
 
     def render_pil(self, ctx: PilContext) -> None:
-        self.p.render_pil(ctx)
-        self.q.render_pil(ctx)
+        if ctx.visible(_bbox_of(self.p)):
+            self.p.render_pil(ctx)
+        if ctx.visible(_bbox_of(self.q)):
+            self.q.render_pil(ctx)
 
 
 Triple = Pair[P, Pair[Q, R]]
 
 
+@_compact
 @dataclass(frozen=True)
 class Latex:
     """
@@ -522,8 +889,8 @@ class Latex:
     def moved(self, dx: float, dy: float) -> Latex:
         return Latex(self.x + dx, self.y + dy, self.source, self.scale_factor, self.align, self.packages)
 
-    def _render(self, scale_factor: float):
-        return render_latex_scaled(self.source, self.packages, scale_factor)
+    def _render(self, scale_factor: float, dpi: int = DEFAULT_DPI):
+        return render_latex_scaled(self.source, self.packages, scale_factor, dpi)
 
     def width(self) -> float:
         img = self._render(self.scale_factor)
@@ -534,16 +901,19 @@ class Latex:
         return img.height / 1920 * 16
 
     def render_pil(self, ctx: PilContext) -> None:
-        scale_factor = self.scale_factor * (ctx.settings.width / 1920)
+        scale_factor = self.scale_factor * (ctx.settings.width / 1920) * ctx.scale
         if scale_factor <= 0.025:
             return
-        img = self._render(scale_factor)
+        img = self._render(scale_factor, ctx.settings.latex_dpi)
         cx, cy = ctx.coord(self.x, self.y)
         x, y = self.align.apply(cx, cy, img.width, img.height)
         ix, iy = map(round, (x, y))
-        ctx.draw.bitmap((ix, iy), img)
+        if ix >= ctx.img.width or iy >= ctx.img.height or ix + img.width <= 0 or iy + img.height <= 0:
+            return
+        ctx.draw.bitmap((ix, iy), img, fill="white")
 
 
+@_compact
 @dataclass(frozen=True)
 class Nil:
     """
@@ -569,6 +939,9 @@ class Nil:
     def aligned(self, align: Align) -> Nil:
         return self
 
+    def bbox(self) -> BBox:
+        return (self.x, self.y, self.x, self.y)
+
     def render_pil(self, ctx: PilContext) -> None:
         pass
 
@@ -576,6 +949,7 @@ class Nil:
 Select = Union[tuple[Literal["p"], PX], tuple[Literal["q"], QX]]
 
 
+@_compact
 @dataclass(frozen=True)
 class Sum(Generic[PX, QX]):
     """
@@ -652,9 +1026,83 @@ class Sum(Generic[PX, QX]):
             ),
         )
 
+    def bbox(self) -> Optional[BBox]:
+        return _bbox_of(self.item[1])
+
     def render_pil(self, ctx: PilContext) -> None:
         _tag, item = self.item
-        item.render_pil(ctx)
+        if ctx.visible(_bbox_of(item)):
+            item.render_pil(ctx)
+
+
+@_compact
+@dataclass(frozen=True)
+class Transform(Generic[P]):
+    """
+    Wrapper around a PilRenderable value that moves and scales it when it's
+    drawn. A point `(x, y)` of the child is drawn at
+    `(x*scale + dx, y*scale + dy)`.
+
+    Moving or scaling a `Transform` doesn't touch the child, so it costs
+    the same no matter how big the child is. This makes it a good camera
+    for panning and zooming a whole scene.
+    """
+
+    child: P
+    dx: float = 0.0
+    dy: float = 0.0
+    scale: float = 1.0
+
+    if TYPE_CHECKING:
+        x: float = field(init = False)
+        y: float = field(init = False)
+    else:
+        @property
+        def x(self) -> float:
+            return self.child.x * self.scale + self.dx
+
+        @property
+        def y(self) -> float:
+            return self.child.y * self.scale + self.dy
+
+    def moved(self, dx: float, dy: float) -> Transform[P]:
+        return Transform(self.child, self.dx + dx, self.dy + dy, self.scale)
+
+    def scaled_about(self, factor: float, cx: float, cy: float) -> Transform[P]:
+        return Transform(
+            self.child,
+            cx + (self.dx - cx) * factor,
+            cy + (self.dy - cy) * factor,
+            self.scale * factor,
+        )
+
+    def scaled(self, factor: float) -> Transform[P]:
+        return self.scaled_about(factor, self.x, self.y)
+
+    def morphed(self: Transform[PX], other: Transform[PX], t: float) -> Transform[PX]:
+        return Transform(
+            self.child.morphed(other.child, t),
+            self.dx * (1 - t) + other.dx * t,
+            self.dy * (1 - t) + other.dy * t,
+            self.scale * (1 - t) + other.scale * t,
+        )
+
+    def bbox(self) -> Optional[BBox]:
+        bbox = _bbox_of(self.child)
+        if bbox is None:
+            return None
+        x1, y1, x2, y2 = (
+            bbox[0] * self.scale + self.dx, bbox[1] * self.scale + self.dy,
+            bbox[2] * self.scale + self.dx, bbox[3] * self.scale + self.dy,
+        )
+        return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+    def render_pil(self, ctx: PilContext) -> None:
+        if self.scale == 0:
+            return  # the whole child is squashed into a point
+        child_ctx = ctx.transformed(self.dx, self.dy, self.scale)
+        if child_ctx.visible(_bbox_of(self.child)):
+            self.child.render_pil(child_ctx)
 
 
 class Opacity(Generic[P]):
@@ -662,6 +1110,8 @@ class Opacity(Generic[P]):
     Wrapper around a PilRenderable value to render it with an opacity (from 0 to 1)
     """
 
+    __slots__ = ("x", "y", "child", "opacity", "_hash")
+
     def __init__(self, child: P, opacity: float = 1.0):
         if not (0 <= opacity <= 1):
             raise ValueError(f"Opacity should be between 0 and 1, got {opacity!r}")
@@ -671,6 +1121,27 @@ class Opacity(Generic[P]):
         self.child = child
         self.opacity = opacity
 
+    def __repr__(self) -> str:
+        return f"Opacity({self.child!r}, {self.opacity!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Opacity):
+            return NotImplemented
+        return (self.child, self.opacity) == (other.child, other.opacity)
+
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.child, self.opacity))
+            return self._hash
+
+    def __getstate__(self) -> tuple[P, float]:
+        return (self.child, self.opacity)
+
+    def __setstate__(self, state: tuple[P, float]):
+        self.__init__(*state)
+
     def morphed(self: Opacity[PX], other: Opacity[PX], t: float) -> Opacity[PX]:
         return Opacity(
             self.child.morphed(other.child, t),
@@ -686,24 +1157,185 @@ class Opacity(Generic[P]):
     def moved(self, dx: float, dy: float) -> Opacity[P]:
         return Opacity(self.child.moved(dx, dy), self.opacity)
 
+    def bbox(self) -> Optional[BBox]:
+        return _bbox_of(self.child)
+
     def fade(self, target: float = 0) -> Animation[Opacity[P]]:
         def projector(t: float):
             return Opacity(self.child, self.opacity * (1 - t) + target * t)
         return Animation(1, projector)
 
     def render_pil(self, ctx: PilContext):
-        new_ctx = ctx.settings.make_ctx()
-        self.child.render_pil(new_ctx)
+        if self.opacity <= 0 or not ctx.visible(_bbox_of(self.child)):
+            return
+
+        alpha = round(255 * self.opacity)
+        mono = ctx.img.mode == "L"
+
+        if ctx.settings.draft:
+            # a plain alpha: scale the layer's own coverage and paste it once,
+            # without the intermediate images used for blending
+            lut = [v * alpha // 255 for v in range(256)]
+            with ctx.scratch() as new_ctx:
+                self.child.render_pil(new_ctx)
+                if mono:
+                    ctx.img.paste(255, mask=new_ctx.img.point(lut))
+                else:
+                    ctx.img.paste(new_ctx.img, mask=new_ctx.img.getchannel("A").point(lut))
+            return
+        with ctx.scratch() as new_ctx, \
+             ctx.scratch_image(alpha if mono else (0, 0, 0, alpha)) as mask, \
+             ctx.scratch_image(0 if mono else (0, 0, 0, 0)) as faded:
+            self.child.render_pil(new_ctx)
+            # the same as `ImageChops.composite`, but into a pooled image
+            faded.paste(new_ctx.img, None, mask)
+            if mono:
+                # everything is white on black, so brightness works as coverage
+                ctx.img.paste(255, mask=faded)
+            else:
+                ctx.img.paste(faded, mask=faded)
+
+
+class GroupArray:
+    """
+    Group of `Rect`s that stores each field of the rectangles in a NumPy
+    array. It behaves like a `Group[Rect]`, but moves, scales, morphs and
+    draws all the rectangles at once, which is much faster for groups of
+    thousands of rectangles.
+
+    The arrays are shared between groups derived from each other,
+    so they should not be modified.
+    """
+
+    __slots__ = ("xs", "ys", "widths", "heights", "line_widths", "_center")
+
+    _FIELDS = ("x", "y", "width", "height", "line_width")
+
+    def __init__(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        widths: np.ndarray,
+        heights: np.ndarray,
+        line_widths: np.ndarray,
+    ):
+        np = _numpy()
+        columns = [np.asarray(column, dtype=float) for column in (xs, ys, widths, heights, line_widths)]
+        if len({column.shape for column in columns}) != 1 or columns[0].ndim != 1:
+            raise ValueError("All fields of a GroupArray should be one-dimensional arrays of the same length")
+        for column in columns:
+            column.flags.writeable = False
+        self.xs, self.ys, self.widths, self.heights, self.line_widths = columns
+        self._center: Optional[tuple[float, float]] = None
+
+    @classmethod
+    def from_rects(cls, rects: Iterable[Rect]) -> GroupArray:
+        np = _numpy()
+        rects = list(rects)
+        return cls(*(
+            np.fromiter((getattr(rect, name) for rect in rects), dtype=float, count=len(rects))
+            for name in cls._FIELDS
+        ))
+
+    @property
+    def items(self) -> list[Rect]:
+        return list(self)
+
+    def __iter__(self) -> Iterator[Rect]:
+        for (x, y, w, h, lw) in zip(
+            self.xs.tolist(), self.ys.tolist(), self.widths.tolist(),
+            self.heights.tolist(), self.line_widths.tolist()
+        ):
+            yield Rect(x, y, w, h, lw)
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GroupArray):
+            return NotImplemented
+        np = _numpy()
+        return all(
+            np.array_equal(getattr(self, name), getattr(other, name))
+            for name in ("xs", "ys", "widths", "heights", "line_widths")
+        )
+
+    __hash__ = None  # type: ignore
 
-        # TODO: find out if there's a way to do this without creating 3 extra images:
+    def __repr__(self) -> str:
+        return f"GroupArray.from_rects({self.items!r})"
 
-        mask = Image.new("RGBA", new_ctx.img.size, (0, 0, 0, round(255 * self.opacity)))
+    if TYPE_CHECKING:
+        x: float
+        y: float
+    else:
+        @property
+        def x(self) -> float:
+            return self.center()[0]
 
-        transparent = Image.new("RGBA", new_ctx.img.size, (0, 0, 0, 0))
-        transparent = ImageChops.composite(new_ctx.img, transparent, mask)
+        @property
+        def y(self) -> float:
+            return self.center()[1]
+
+    def center(self) -> tuple[float, float]:
+        if len(self) == 0:
+            raise ValueError("Cannot find a center of an empty group")
+        if self._center is None:
+            self._center = (float(self.xs.mean()), float(self.ys.mean()))
+        return self._center
+
+    def bbox(self) -> Optional[BBox]:
+        if len(self) == 0:
+            return None
+        return (
+            float((self.xs - self.widths/2).min()), float((self.ys - self.heights/2).min()),
+            float((self.xs + self.widths/2).max()), float((self.ys + self.heights/2).max()),
+        )
 
-        buffer = Image.new("RGBA", new_ctx.img.size, (0, 0, 0, 0))
-        buffer.paste(ctx.img)
-        buffer.paste(transparent, mask=transparent)
+    def moved(self, dx: float, dy: float) -> GroupArray:
+        return GroupArray(self.xs + dx, self.ys + dy, self.widths, self.heights, self.line_widths)
+
+    def scaled_about(self, factor: float, cx: float, cy: float) -> GroupArray:
+        return GroupArray(
+            cx + (self.xs - cx)*factor,
+            cy + (self.ys - cy)*factor,
+            self.widths*factor,
+            self.heights*factor,
+            self.line_widths,
+        )
+
+    def scaled(self, factor: float) -> GroupArray:
+        return self.scaled_about(factor, *self.center())
+
+    def morphed(self, other: GroupArray, t: float) -> GroupArray:
+        if len(self) != len(other):
+            raise NotImplementedError("Morphing groups with different lengths isn't implemented yet")
+        return GroupArray(
+            self.xs * (1 - t) + other.xs * t,
+            self.ys * (1 - t) + other.ys * t,
+            self.widths * (1 - t) + other.widths * t,
+            self.heights * (1 - t) + other.heights * t,
+            self.line_widths * (1 - t) + other.line_widths * t,
+        )
+
+    def render_pil(self, ctx: PilContext) -> None:
+        np = _numpy()
+        visible = (self.widths > 0) & (self.heights > 0)
+        xs, ys = self.xs[visible], self.ys[visible]
+        half_ws, half_hs = self.widths[visible]/2, self.heights[visible]/2
+        x1s, y1s = ctx.coord_arrays(xs - half_ws, ys - half_hs)
+        x2s, y2s = ctx.coord_arrays(xs + half_ws, ys + half_hs)
+        line_widths = np.maximum(1, np.rint(self.line_widths[visible] * 4 * ctx.img.width / 1920).astype(int))
+
+        # outlines are drawn inside the rectangles, so this is exact
+        width, height = ctx.img.size
+        on_screen = (
+            (np.maximum(x1s, x2s) >= 0) & (np.minimum(x1s, x2s) < width)
+            & (np.maximum(y1s, y2s) >= 0) & (np.minimum(y1s, y2s) < height)
+        )
+        x1s, y1s, x2s, y2s = x1s[on_screen], y1s[on_screen], x2s[on_screen], y2s[on_screen]
+        line_widths = line_widths[on_screen]
 
-        ctx.img.paste(buffer)
+        rectangle = ctx.draw.rectangle
+        for (x1, y1, x2, y2, lw) in zip(x1s.tolist(), y1s.tolist(), x2s.tolist(), y2s.tolist(), line_widths.tolist()):
+            rectangle(((x1, y1), (x2, y2)), fill=None, outline=0xffffff, width=lw)
@@ -5,11 +5,11 @@ import shutil
 from typing import Iterable
 from PIL import Image
 from lanim.threaded_cache import threaded_cache
-from lanim.latex import render_latex_to_png
+from lanim.latex import DEFAULT_DPI, render_latex_to_png
 
 
 CACHE_DIR = Path("_latex_cache")
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
+"Created when the first LaTeX image is rendered"
 
 
 def long_hash(latex: str) -> str:
@@ -34,25 +34,44 @@ def image_from_file(path: Path) -> Image.Image:
 
 
 @threaded_cache
-def _render_latex(_: tuple[str, Iterable[str]]) -> Image.Image:
-    latex, packages = _
-    filename = CACHE_DIR / f"{long_hash(latex)}.png"
+def _render_latex(_: tuple[str, Iterable[str], int]) -> Image.Image:
+    latex, packages, dpi = _
+    suffix = "" if dpi == DEFAULT_DPI else f"_{dpi}dpi"
+    filename = CACHE_DIR / f"{long_hash(latex)}{suffix}.png"
     if filename.exists():
         return image_from_file(filename)
     def on_render(p: Path):
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
         shutil.copy(p, filename)
         return image_from_file(filename)
-    return render_latex_to_png(latex, packages, on_render)
+    return render_latex_to_png(latex, packages, on_render, dpi)
 
-@threaded_cache
-def _render_latex_scaled(_: tuple[str, Iterable[str], float]) -> Image.Image:
-    latex, packages, scale_factor = _
-    img = _render_latex((latex, packages))
+
+LATEX_SCALED_CACHE_SIZE = 256
+"""
+How many scaled LaTeX images to keep. An object changing its size makes a
+new scaled image on every frame, so they can't all be kept.
+"""
+
+
+def _scale_latex(_: tuple[str, Iterable[str], float, int]) -> Image.Image:
+    latex, packages, scale_factor, dpi = _
+    img = _render_latex((latex, packages, dpi))
+    # images rendered at a lower resolution are stretched to the same size
+    scale_factor *= DEFAULT_DPI / dpi
     return img.resize((
         int(img.width * scale_factor),
         int(img.height * scale_factor)
     ))
 
 
-def render_latex_scaled(latex: str, packages: Iterable[str], scale_factor: float) -> Image.Image:
-    return _render_latex_scaled((latex, packages, scale_factor))
+_render_latex_scaled = threaded_cache(_scale_latex, LATEX_SCALED_CACHE_SIZE)
+
+
+def render_latex_scaled(
+    latex: str,
+    packages: Iterable[str],
+    scale_factor: float,
+    dpi: int = DEFAULT_DPI,
+) -> Image.Image:
+    return _render_latex_scaled((latex, packages, scale_factor, dpi))
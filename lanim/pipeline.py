@@ -0,0 +1,202 @@
+"""
+Multi-stage processing pipelines.
+
+A pipeline consists of a source of numbered items and a sequence of stages.
+Each stage runs on its own pool of threads and is connected to the next one
+by a bounded queue, so a slow stage applies backpressure to the stages before
+it instead of letting work pile up in memory.
+
+Stages doing work that releases the GIL (compression, I/O, subprocesses)
+overlap with Python-heavy stages this way.
+
+Example:
+
+>>> stages = [
+...     Stage("square", lambda: lambda i, x: x * x),
+...     Stage("print", lambda: lambda i, x: print(i, x)),
+... ]
+>>> stats = run_pipeline(enumerate([1, 2, 3]), stages)
+0 1
+1 4
+2 9
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from queue import Queue
+from threading import Lock, Thread
+import time
+from typing import Any, Callable, Generic, Iterable, Optional, Sequence, TypeVar
+
+
+A = TypeVar("A")
+B = TypeVar("B")
+
+
+__all__ = [
+    "Stage",
+    "StageStats",
+    "run_pipeline",
+    "benchmark_stage",
+    "zip_stage",
+]
+
+
+@dataclass(frozen=True)
+class Stage(Generic[A, B]):
+    """
+    A step of a pipeline transforming items of type A into items of type B
+    """
+
+    name: str
+    "Human-readable name, used in the statistics"
+
+    make_worker: Callable[[], Callable[[int, A], B]]
+    """
+    Called once in each worker thread to get a function processing a
+    single item. The function receives the item's index and its value.
+    This is the place to set up per-thread state, like a canvas.
+    """
+
+    workers: int = 1
+    "How many threads to run this stage on"
+
+
+@dataclass
+class StageStats:
+    """
+    Timing statistics of a stage collected while running a pipeline
+    """
+
+    name: str
+    "Name of the stage"
+
+    items: int = 0
+    "How many items the stage has processed"
+
+    busy: float = 0.0
+    "Total time spent processing items, summed over all threads, in seconds"
+
+    def per_item(self) -> float:
+        """
+        Average time it took to process one item, in seconds
+        """
+        return self.busy / self.items if self.items else 0.0
+
+
+_Job = Optional[tuple[int, Any]]
+
+
+class _Run:
+    """
+    State shared between the threads of a single pipeline run
+    """
+
+    def __init__(self, stages: Sequence[Stage[Any, Any]], queue_size: int):
+        self.stages = stages
+        self.queues: list[Queue[_Job]] = [Queue(maxsize=queue_size) for _ in stages]
+        self.stats = [StageStats(stage.name) for stage in stages]
+        self.running = [stage.workers for stage in stages]
+        self.errors: list[BaseException] = []
+        self.lock = Lock()
+
+    def work(self, n: int):
+        stage = self.stages[n]
+        inbox = self.queues[n]
+        outbox = self.queues[n + 1] if n + 1 < len(self.stages) else None
+        stats = self.stats[n]
+        try:
+            process = stage.make_worker()
+            for (index, value) in iter(inbox.get, None):
+                if self.errors:
+                    continue
+                t1 = time.perf_counter()
+                result = process(index, value)
+                t2 = time.perf_counter()
+                with self.lock:
+                    stats.items += 1
+                    stats.busy += t2 - t1
+                if outbox is not None:
+                    outbox.put((index, result))
+        except BaseException as e:
+            with self.lock:
+                self.errors.append(e)
+            # keep draining the queue so that upstream stages never block on us
+            for _ in iter(inbox.get, None):
+                pass
+        finally:
+            with self.lock:
+                self.running[n] -= 1
+                last = self.running[n] == 0
+            if last and outbox is not None:
+                for _ in range(self.stages[n + 1].workers):
+                    outbox.put(None)
+
+
+def run_pipeline(
+    source: Iterable[tuple[int, A]],
+    stages: Sequence[Stage[Any, Any]],
+    queue_size: int = 4,
+) -> list[StageStats]:
+    """
+    Feed numbered items from `source` through `stages` and wait until
+    all of them are processed. The output of the last stage is discarded,
+    so it should be a sink that stores the result somewhere.
+
+    Items are pulled from `source` lazily, and at most `queue_size` items
+    wait in front of each stage. Items may reach later stages out of order.
+
+    If any stage raises an exception, the pipeline is stopped and the first
+    exception is re-raised.
+    """
+    if not stages:
+        raise ValueError("No stages")
+
+    run = _Run(stages, queue_size)
+    threads = [
+        Thread(target=run.work, args=(n,), name=f"{stage.name}-{i}")
+        for (n, stage) in enumerate(stages)
+        for i in range(stage.workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in source:
+            if run.errors:
+                break
+            run.queues[0].put(item)
+    finally:
+        for _ in range(stages[0].workers):
+            run.queues[0].put(None)
+        for thread in threads:
+            thread.join()
+
+    if run.errors:
+        raise run.errors[0]
+    return run.stats
+
+
+def benchmark_stage(stage: Stage[A, B], inputs: Iterable[A]) -> StageStats:
+    """
+    Run a single stage on its own over `inputs`, which are materialized
+    beforehand so that only the stage itself is measured.
+    """
+    items = list(enumerate(inputs))
+    [stats] = run_pipeline(items, [stage], queue_size=max(1, len(items)))
+    return stats
+
+
+def zip_stage(name: str, stages: Sequence[Stage[Any, Any]], workers: int = 1) -> Stage[tuple[Any, ...], tuple[Any, ...]]:
+    """
+    Stage processing tuples, passing the i-th item of each tuple through
+    the i-th of `stages`. Only the `make_worker` of the stages is used, so
+    their `workers` are ignored in favor of `workers`.
+    """
+    def make_worker() -> Callable[[int, tuple[Any, ...]], tuple[Any, ...]]:
+        processes = [stage.make_worker() for stage in stages]
+        def process(index: int, values: tuple[Any, ...]) -> tuple[Any, ...]:
+            return tuple(f(index, value) for (f, value) in zip(processes, values))
+        return process
+    return Stage(name, make_worker, workers)
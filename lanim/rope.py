@@ -0,0 +1,227 @@
+"""
+Immutable sequence with cheap appending and concatenation.
+
+A `Rope` is a balanced binary tree whose leaves are small tuples. Appending
+an item or concatenating two ropes builds O(log n) new nodes and shares the
+rest of the tree with the original ropes, so growing a sequence one item at
+a time doesn't copy it over and over:
+
+>>> r = Rope.of(range(3))
+>>> r2 = r.append(3).concat(Rope.of([4, 5]))
+>>> r2
+Rope([0, 1, 2, 3, 4, 5])
+>>> r
+Rope([0, 1, 2])
+>>> r2 == [0, 1, 2, 3, 4, 5]
+True
+"""
+
+from __future__ import annotations
+
+from itertools import islice
+from typing import Any, Generic, Iterable, Iterator, Optional, Sequence, TypeVar, Union, overload
+
+
+__all__ = [
+    "Rope",
+]
+
+
+T = TypeVar("T", covariant=True)
+U = TypeVar("U")
+
+
+CHUNK_SIZE = 32
+"Maximum number of items in a leaf"
+
+
+class Rope(Sequence[T], Generic[T]):
+    """
+    Persistent sequence. It compares equal to lists and tuples with the
+    same items, and its hash is the hash of the tuple of its items.
+    """
+
+    __slots__ = ("_leaf", "_left", "_right", "_len", "_height", "_hash")
+
+    _leaf: Optional[tuple[T, ...]]
+    _left: Rope[T]
+    _right: Rope[T]
+    _len: int
+    _height: int
+
+    def __init__(self, items: Iterable[T] = ()):
+        items = tuple(items)
+        if len(items) <= CHUNK_SIZE:
+            self._set_leaf(items)
+            return
+        leaves = [Rope._from_leaf(items[i:i + CHUNK_SIZE]) for i in range(0, len(items), CHUNK_SIZE)]
+        middle = len(leaves) // 2
+        self._set_node(_build(leaves[:middle]), _build(leaves[middle:]))
+
+    @classmethod
+    def of(cls, items: Iterable[U]) -> Rope[U]:
+        """
+        Return `items` as a rope, without copying it if it's a rope already
+        """
+        return items if isinstance(items, Rope) else cls(items)  # type: ignore
+
+    # Construction:
+
+    def _set_leaf(self, items: tuple[Any, ...]):
+        self._leaf = items
+        self._len = len(items)
+        self._height = 0
+        self._hash = None
+
+    def _set_node(self, left: Rope[Any], right: Rope[Any]):
+        self._leaf = None
+        self._left = left
+        self._right = right
+        self._len = left._len + right._len
+        self._height = max(left._height, right._height) + 1
+        self._hash = None
+
+    @staticmethod
+    def _from_leaf(items: tuple[U, ...]) -> Rope[U]:
+        rope: Rope[U] = Rope.__new__(Rope)
+        rope._set_leaf(items)
+        return rope
+
+    @staticmethod
+    def _from_children(left: Rope[U], right: Rope[U]) -> Rope[U]:
+        rope: Rope[U] = Rope.__new__(Rope)
+        rope._set_node(left, right)
+        return rope
+
+    # Persistent updates:
+
+    def append(self, item: U) -> Rope[Union[T, U]]:
+        """
+        New rope with `item` added at the end. Takes O(log n) time.
+        """
+        return _join(self, Rope._from_leaf((item,)))
+
+    def concat(self, other: Iterable[U]) -> Rope[Union[T, U]]:
+        """
+        New rope with the items of `other` added at the end. Takes
+        O(log n) time if `other` is a rope.
+        """
+        return _join(self, Rope.of(other))
+
+    def __add__(self, other: Iterable[U]) -> Rope[Union[T, U]]:
+        return self.concat(other)
+
+    # Sequence protocol:
+
+    def __len__(self) -> int:
+        return self._len
+
+    @overload
+    def __getitem__(self, index: int) -> T: ...
+    @overload
+    def __getitem__(self, index: slice) -> Rope[T]: ...
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step == 1:
+                return Rope(islice(self._iter_from(start), max(0, stop - start)))
+            return Rope(tuple(self)[index])
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("Rope index out of range")
+        node = self
+        while node._leaf is None:
+            if index < node._left._len:
+                node = node._left
+            else:
+                index -= node._left._len
+                node = node._right
+        return node._leaf[index]
+
+    def __iter__(self) -> Iterator[T]:
+        return self._iter_from(0)
+
+    def _iter_from(self, start: int) -> Iterator[T]:
+        stack: list[Rope[T]] = [self]
+        while stack:
+            node = stack.pop()
+            if start >= node._len:
+                start -= node._len
+                continue
+            if node._leaf is not None:
+                yield from islice(node._leaf, start, None)
+                start = 0
+            else:
+                stack.append(node._right)
+                stack.append(node._left)
+
+    # Comparison:
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, (Rope, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for (a, b) in zip(self, other))
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"Rope({list(self)!r})"
+
+    def __getstate__(self):
+        return tuple(self)
+
+    def __setstate__(self, state: tuple[Any, ...]):
+        Rope.__init__(self, state)
+
+
+def _build(leaves: list[Rope[U]]) -> Rope[U]:
+    """
+    Perfectly balanced tree from a non-empty list of leaves
+    """
+    if len(leaves) == 1:
+        return leaves[0]
+    middle = len(leaves) // 2
+    return Rope._from_children(_build(leaves[:middle]), _build(leaves[middle:]))
+
+
+def _join(a: Rope[U], b: Rope[U]) -> Rope[U]:
+    """
+    Concatenate two ropes, keeping the tree balanced (like joining AVL trees)
+    """
+    if not a._len:
+        return b
+    if not b._len:
+        return a
+    if a._height > b._height and (a._height > b._height + 1 or b._leaf is not None):
+        # descend to the rightmost leaf, so small leaves get merged
+        return _balance(a._left, _join(a._right, b))
+    if b._height > a._height and (b._height > a._height + 1 or a._leaf is not None):
+        return _balance(_join(a, b._left), b._right)
+    if a._leaf is not None and b._leaf is not None and a._len + b._len <= CHUNK_SIZE:
+        return Rope._from_leaf(a._leaf + b._leaf)
+    return Rope._from_children(a, b)
+
+
+def _balance(left: Rope[U], right: Rope[U]) -> Rope[U]:
+    node = Rope._from_children
+    if left._height > right._height + 1:
+        if left._left._height >= left._right._height:
+            return node(left._left, node(left._right, right))
+        return node(
+            node(left._left, left._right._left),
+            node(left._right._right, right),
+        )
+    if right._height > left._height + 1:
+        if right._right._height >= right._left._height:
+            return node(node(left, right._left), right._right)
+        return node(
+            node(left, right._left._left),
+            node(right._left._right, right._right),
+        )
+    return node(left, right)
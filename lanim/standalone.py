@@ -1,11 +1,20 @@
+from collections.abc import Sequence as SequenceABC
+import dataclasses
 import pathlib
 import importlib
+import math
 import subprocess
-from typing import Protocol
+import sys
+import sysconfig
+import time
+import traceback
+import types
+from typing import Any, Optional, Protocol, Sequence
 
-from lanim.core import Animation, crop_by_range
+from lanim.core import Animation, crop_by_range, frame_count, frame_progress, shard_range
+from lanim import tools
 from lanim.pil_types import PilRenderable
-from lanim.pil_machinery import render_pil
+from lanim.pil_machinery import Variant, contact_sheet, default_settings, render_frame, render_frames, render_pil
 
 
 class Options(Protocol):
@@ -17,30 +26,29 @@ class Options(Protocol):
     temp_dir: pathlib.Path
     output: pathlib.Path
     threads: int
+    processes: int
     range: tuple[int, int]
+    shard: Optional[tuple[int, int]]
+    frames: Optional[tuple[int, int]]
+    farm: Optional[str]
+    farm_workers: int
+    draft: Optional[float]
+    time_budget: Optional[float]
+    mono: bool
+    also: list[tuple[int, int, pathlib.Path]]
+    resize_variants: bool
+    watch: bool
+    still: Optional[float]
+    contact_sheet: Optional[int]
 
 
-def _is_present(*cmd: str):
-    try:
-        proc =subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        proc.kill()
-    except FileNotFoundError:
-        return False
-    else:
-        return True
-
-
-def _ensure_dependencies_exist():
-    for command, reason in (
-        ("pdflatex", "render LaTex to DVI"),
-        ("ffmpeg", "compile a series of images into a video"),
-        ("dvipng", "convert DVI to PNG")
-    ):
-        if not _is_present(command, "--help"):
-            raise RuntimeError(
-                "The `{}` program is not found. It's needed to {}."
-                .format(command, reason)
-            )
+def _require_ffmpeg():
+    """
+    ffmpeg is checked before rendering rather than when the frames are
+    ready, so that a long render isn't wasted. LaTeX is checked only
+    when the scene uses it, see `lanim.tools`.
+    """
+    tools.require("ffmpeg", "compile a series of images into a video")
 
 
 def _crop_animation(
@@ -51,6 +59,50 @@ def _crop_animation(
     return crop_by_range(anim, start / 100, (finish + 1) / 100)
 
 
+def _drafted(width: int, height: int, fps: int, draft: Optional[float]) -> tuple[int, int, int]:
+    """
+    Resolution and frame rate scaled down by the draft factor, if there is one
+    """
+    if draft is None:
+        return (width, height, fps)
+    return (max(16, round(width * draft)), max(9, round(height * draft)), max(1, round(fps * draft)))
+
+
+def _apply_draft(options: Options):
+    """
+    Scale down the resolution and the frame rate by the draft factor
+    """
+    if options.draft is None:
+        return
+    (options.width, options.height, options.fps) = _drafted(
+        options.width, options.height, options.fps, options.draft
+    )
+    options.also = [
+        (*_drafted(width, height, options.fps, options.draft)[:2], output)
+        for (width, height, output) in options.also
+    ]
+
+
+def _select_frames(options: Options, total: int) -> Optional[range]:
+    if options.shard is not None:
+        shard, shards = options.shard
+        selected = shard_range(total, shard - 1, shards)
+    elif options.frames is not None:
+        start, stop = options.frames
+        if stop > total:
+            raise ValueError(
+                "The animation only has {} frames, can't render frames {}:{}"
+                .format(total, start, stop)
+            )
+        selected = range(start, stop)
+    else:
+        return None
+
+    if len(selected) == 0:
+        raise ValueError("There are no frames to render in this piece")
+    return selected
+
+
 def _find_animation(module_name: str, export_name: str) -> Animation[PilRenderable]:
     try:
         module = importlib.import_module(module_name)
@@ -79,14 +131,77 @@ def _purge_temp_dir(path: pathlib.Path):
         file.unlink()
 
 
-def entry_point(options: Options) -> None:
-    _purge_temp_dir(options.temp_dir)
+def _variants(options: Options) -> list[tuple[Variant, pathlib.Path]]:
+    """
+    The extra resolutions requested with `--also`, with their output files.
+    Their frames go to subdirectories of the temporary directory.
+    """
+    return [
+        (Variant(width, height, options.temp_dir / f"{width}x{height}", options.resize_variants), output)
+        for (width, height, output) in options.also
+    ]
 
-    _ensure_dependencies_exist()
 
-    animation = _find_animation(options.module, options.export_name)
-    animation = _crop_animation(animation, *options.range)
+def _encode_videos(
+    options: Options,
+    start: int,
+    outputs: list[tuple[pathlib.Path, pathlib.Path]],
+) -> list[pathlib.Path]:
+    """
+    Compile the frames in each directory into its output file,
+    running an ffmpeg for each of them at the same time.
+    Return the outputs ffmpeg failed to make.
+    """
+    ffmpeg_processes = [
+        subprocess.Popen([
+            "ffmpeg",
+            "-y",  # overwrite the output file
+            "-framerate", str(options.fps),
+            "-start_number", str(start),  # signal which frame_N.png is the
+                                          # first file (usually frame_0.png)
+            "-i", str(frames_dir / "frame_%d.png"),
+            str(output),
+        ])
+        for (frames_dir, output) in outputs
+    ]
+    return [
+        output
+        for (ffmpeg_process, (_, output)) in zip(ffmpeg_processes, outputs)
+        if ffmpeg_process.wait() != 0
+    ]
 
+
+def _render_on_farm(options: Options, address: str, selected: range):
+    # only imported when needed, since it takes a while
+    from lanim.farm import FarmJob, parse_address, serve_frames, spawn_local_workers
+
+    job = FarmJob(
+        module=options.module,
+        export_name=options.export_name,
+        width=options.width,
+        height=options.height,
+        fps=options.fps,
+        range=options.range,
+        draft=options.draft is not None,
+        mono=options.mono,
+    )
+    parsed_address = parse_address(address)
+    workers: list[subprocess.Popen[bytes]] = []
+    def on_listen():
+        workers.extend(spawn_local_workers(parsed_address, options.farm_workers, options.threads))
+    try:
+        serve_frames(parsed_address, job, options.temp_dir, selected, on_listen=on_listen)
+    finally:
+        for worker in workers:
+            worker.wait()
+
+
+def _render_locally(
+    options: Options,
+    animation: Animation[PilRenderable],
+    frame_numbers: Optional[Sequence[int]],
+    variants: list[tuple[Variant, pathlib.Path]],
+):
     render_pil(
         width=options.width,
         height=options.height,
@@ -94,15 +209,316 @@ def entry_point(options: Options) -> None:
         path=options.temp_dir,
         fps=options.fps,
         workers=options.threads,
+        frame_numbers=frame_numbers,
+        draft=options.draft is not None,
+        time_budget=options.time_budget,
+        mono=options.mono,
+        processes=options.processes,
+        variants=[variant for (variant, _) in variants],
     )
 
-    ffmpeg_process = subprocess.Popen([
-        "ffmpeg",
-        "-y",  # overwrite the output file
-        "-framerate", str(options.fps),
-        "-start_number", "0",  # signal that frame_0.png is the
-                               # first file and not frame_1.png
-        "-i", str(options.temp_dir / "frame_%d.png"),
-        str(options.output),
-    ])
-    ffmpeg_process.wait()
\ No newline at end of file
+
+def _outputs(options: Options, variants: list[tuple[Variant, pathlib.Path]]) -> list[tuple[pathlib.Path, pathlib.Path]]:
+    """
+    Pairs of a directory with frames and the video made of them
+    """
+    return [
+        (options.temp_dir, options.output),
+        *((variant.path, output) for (variant, output) in variants),
+    ]
+
+
+def _render_stills(options: Options):
+    """
+    Save a single frame, or a grid of evenly spaced frames, as an image
+    """
+    animation = _find_animation(options.module, options.export_name)
+    animation = _crop_animation(animation, *options.range)
+    draft = options.draft is not None
+
+    if options.contact_sheet is not None:
+        count = options.contact_sheet
+        if count < 1:
+            raise ValueError("A contact sheet needs at least one frame, got {}".format(count))
+        columns = math.ceil(math.sqrt(count))
+        settings = default_settings(
+            max(16, options.width // columns), max(9, options.height // columns), draft, options.mono
+        )
+        times = [animation.duration * i / max(1, count - 1) for i in range(count)]
+        images = render_frames(animation, times, settings, options.threads)
+        img = contact_sheet(images, columns, ["{:.2f}s".format(t) for t in times])
+    else:
+        settings = default_settings(options.width, options.height, draft, options.mono)
+        img = render_frame(animation, options.still or 0.0, settings)
+
+    options.output.parent.mkdir(parents=True, exist_ok=True)
+    img.save(options.output)
+    print("Saved {}".format(options.output))
+
+
+def entry_point(options: Options) -> None:
+    if options.still is not None or options.contact_sheet is not None:
+        _apply_draft(options)
+        _render_stills(options)
+        return
+
+    _purge_temp_dir(options.temp_dir)
+    _apply_draft(options)
+    variants = _variants(options)
+    if variants and options.farm is not None:
+        raise ValueError("--also can't be combined with --farm")
+    if options.watch and options.farm is not None:
+        raise ValueError("--watch can't be combined with --farm")
+    for (variant, _) in variants:
+        _purge_temp_dir(variant.path)
+
+    _require_ffmpeg()
+
+    animation = _find_animation(options.module, options.export_name)
+    animation = _crop_animation(animation, *options.range)
+
+    total = frame_count(animation, options.fps)
+    selected = _select_frames(options, total)
+
+    if options.farm is not None:
+        _render_on_farm(options, options.farm, selected or range(total))
+    else:
+        _render_locally(options, animation, selected, variants)
+
+    start = selected.start if selected is not None else 0
+    failed = _encode_videos(options, start, _outputs(options, variants))
+
+    if selected is not None:
+        from lanim.merge import ShardManifest, manifest_path
+        if failed:
+            # a manifest left from an earlier render would vouch for the broken piece
+            for output in failed:
+                manifest_path(output).unlink(missing_ok=True)
+            sys.exit("ffmpeg failed to make {}, not writing the shard manifests".format(
+                ", ".join(map(str, failed))
+            ))
+        for (width, height, output) in (
+            (options.width, options.height, options.output),
+            *((variant.width, variant.height, output) for (variant, output) in variants),
+        ):
+            ShardManifest(
+                module=options.module,
+                export_name=options.export_name,
+                width=width,
+                height=height,
+                fps=options.fps,
+                total_frames=total,
+                start=selected.start,
+                stop=selected.stop,
+            ).write(manifest_path(output))
+    if failed:
+        sys.exit("ffmpeg failed to make {}".format(", ".join(map(str, failed))))
+
+    if options.watch:
+        frames = selected or range(total)
+        _watch(options, variants, _scene_trees(animation, options.fps, frames))
+
+
+# Watch mode:
+
+WATCH_INTERVAL = 0.3
+"How often to check the scene's files for changes, in seconds"
+
+
+def _user_modules() -> dict[str, pathlib.Path]:
+    """
+    Loaded modules that don't belong to Python, installed packages or
+    lanim itself (except for its examples), by name
+    """
+    library_dirs = {
+        pathlib.Path(sysconfig.get_paths()[key]).resolve()
+        for key in ("stdlib", "platstdlib", "purelib", "platlib")
+    }
+    lanim_dir = pathlib.Path(__file__).parent.resolve()
+    modules = {}
+    for (name, module) in list(sys.modules.items()):
+        file = getattr(module, "__file__", None)
+        if file is None:
+            continue
+        path = pathlib.Path(file).resolve()
+        if path.parent == lanim_dir:
+            continue
+        if lanim_dir not in path.parents and any(d in path.parents for d in library_dirs):
+            continue
+        modules[name] = path
+    return modules
+
+
+def _mtimes(files: Sequence[pathlib.Path]) -> dict[pathlib.Path, Optional[float]]:
+    result: dict[pathlib.Path, Optional[float]] = {}
+    for file in files:
+        try:
+            result[file] = file.stat().st_mtime
+        except OSError:
+            result[file] = None
+    return result
+
+
+def _scene_trees(
+    animation: Animation[PilRenderable],
+    fps: int,
+    frames: Sequence[int],
+) -> dict[int, PilRenderable]:
+    """
+    The scene tree of each frame. They're kept rather than hashed, since
+    hashes can collide and many trees (e.g. with lists) aren't hashable.
+    """
+    return {frame: animation.projector(frame_progress(animation, fps, frame)) for frame in frames}
+
+
+_EMPTY_CELL = object()
+
+
+def _scene_parts(old: Any, new: Any) -> Optional[list[tuple[Any, Any]]]:
+    """
+    Pairs of corresponding parts of two objects of the same type that
+    aren't `==`, or `None` if they can't be taken apart or differ in shape
+    """
+    if isinstance(old, types.FunctionType):
+        if old.__code__ != new.__code__:
+            return None
+        def cells(f: types.FunctionType) -> list[Any]:
+            contents = []
+            for cell in f.__closure__ or ():
+                try:
+                    contents.append(cell.cell_contents)
+                except ValueError:
+                    contents.append(_EMPTY_CELL)
+            return contents
+        return [
+            (old.__defaults__, new.__defaults__),
+            (old.__kwdefaults__, new.__kwdefaults__),
+            *zip(cells(old), cells(new)),
+        ]
+    if isinstance(old, types.MethodType):
+        return [(old.__func__, new.__func__), (old.__self__, new.__self__)]
+    if isinstance(old, dict):
+        if old.keys() != new.keys():
+            return None
+        return [(old[key], new[key]) for key in old]
+    if dataclasses.is_dataclass(old):
+        return [
+            (getattr(old, field.name), getattr(new, field.name))
+            for field in dataclasses.fields(old) if field.compare
+        ]
+    if isinstance(old, SequenceABC) and not isinstance(old, (str, bytes)):
+        if len(old) != len(new):
+            return None
+        return list(zip(old, new))
+    if hasattr(type(old), "__getstate__") and type(old).__getstate__ is not getattr(object, "__getstate__", None):
+        return [(old.__getstate__(), new.__getstate__())]
+    return None
+
+
+def _is_same_scene(old: Any, new: Any, assumed: Optional[set[tuple[int, int]]] = None) -> bool:
+    """
+    Whether two scene trees are equal. Re-importing a module creates new
+    functions, so functions inside the trees (like the morphing strategy
+    of a `Sum`) are compared by their code, default arguments and captured
+    variables, but not by the globals they use. Trees that can't be
+    compared, e.g. because they contain arrays, are considered different.
+    """
+    if old is new:
+        return True
+    if type(old) is not type(new):
+        return False
+    try:
+        if old == new:
+            return True
+    except Exception:
+        pass
+
+    if assumed is None:
+        assumed = set()
+    if isinstance(old, types.FunctionType):
+        # functions can refer to themselves through their closures
+        key = (id(old), id(new))
+        if key in assumed:
+            return True  # already being compared further up
+        assumed.add(key)
+    try:
+        parts = _scene_parts(old, new)
+        return parts is not None and all(_is_same_scene(a, b, assumed) for (a, b) in parts)
+    except RecursionError:
+        return False
+
+
+def _changed_frames(old_scenes: dict[int, PilRenderable], new_scenes: dict[int, PilRenderable]) -> list[int]:
+    """
+    Frames of `new_scenes` that are missing from `old_scenes` or differ
+    """
+    missing = object()
+    return [
+        frame for (frame, scene) in new_scenes.items()
+        if not _is_same_scene(old_scenes.get(frame, missing), scene)
+    ]
+
+
+def _watch(
+    options: Options,
+    variants: list[tuple[Variant, pathlib.Path]],
+    scenes: dict[int, PilRenderable],
+):
+    """
+    Re-render the frames whose scene trees change whenever a source file
+    of the scene changes, until interrupted with Ctrl+C. lanim itself isn't
+    reloaded, so its caches stay warm.
+    """
+    modules = _user_modules()
+    mtimes = _mtimes(list(modules.values()))
+    print(f"Watching {len(mtimes)} files for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            if _mtimes(list(mtimes)) == mtimes:
+                continue
+
+            t1 = time.time()
+            for name in modules:
+                sys.modules.pop(name, None)
+            importlib.invalidate_caches()
+            try:
+                animation = _find_animation(options.module, options.export_name)
+                animation = _crop_animation(animation, *options.range)
+                total = frame_count(animation, options.fps)
+                frames = _select_frames(options, total) or range(total)
+                new_scenes = _scene_trees(animation, options.fps, frames)
+            except Exception:
+                traceback.print_exc()
+                print("Not updating the video, waiting for the next change")
+                # a failed import leaves some modules unloaded, so watch the old list
+                mtimes = _mtimes(list(mtimes))
+                continue
+            finally:
+                modules = {**modules, **_user_modules()}
+            mtimes = _mtimes(list(modules.values()))
+
+            changed = _changed_frames(scenes, new_scenes)
+            removed = set(scenes) - set(new_scenes)
+            for frame in removed:
+                for (frames_dir, _) in _outputs(options, variants):
+                    (frames_dir / f"frame_{frame}.png").unlink(missing_ok=True)
+            scenes = new_scenes
+
+            if not changed and not removed:
+                print("No frames changed")
+                continue
+            if changed:
+                _render_locally(options, animation, changed, variants)
+            failed = _encode_videos(options, frames.start, _outputs(options, variants))
+            if failed:
+                print("ffmpeg failed to make {}, waiting for the next change".format(
+                    ", ".join(map(str, failed))
+                ))
+                continue
+            print(
+                f"Updated {options.output} in {time.time() - t1:.1f}s: "
+                f"{len(changed)} of {len(frames)} frames changed"
+            )
+    except KeyboardInterrupt:
+        print("Stopped watching")
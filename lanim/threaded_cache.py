@@ -1,23 +1,25 @@
 from dataclasses import dataclass
 import threading
-from typing import Callable, Generic, Hashable, Union, TypeVar
+from typing import Callable, Generic, Hashable, Optional, Union, TypeVar
 
 
 A = TypeVar("A")
 K = TypeVar("K", bound=Hashable)
 
 
-@dataclass(frozen=True)
-class InProgress:
-    lock: threading.Lock
-
-
 @dataclass(frozen=True)
 class Available(Generic[A]):
     result: A
 
 
-CacheStatus = Union[InProgress, Available[A]]
+@dataclass
+class InProgress(Generic[A]):
+    lock: threading.Lock
+    outcome: Optional[Available[A]] = None
+    "Set by the thread computing the result before it releases `lock`"
+
+
+CacheStatus = Union[InProgress[A], Available[A]]
 
 
 class ThreadedCache(Generic[K, A]):
@@ -26,57 +28,81 @@ class ThreadedCache(Generic[K, A]):
 
     E.g. if thread 1 and thread 2 request the same item, it should only be
     computed once, even if thread 2 "ordered" it later.
+
+    If `max_size` is given, the least recently used results are dropped
+    when there are more of them. Results that are still being computed
+    are never dropped, and threads waiting for a result get it even if
+    it's dropped right after.
     """
 
     _factory: Callable[[K], A]
     _store: dict[K, CacheStatus[A]]
-    _read_lock: threading.Lock
+    _lock: threading.Lock
+    _max_size: Optional[int]
 
-    def __init__(self, factory: Callable[[K], A]):
+    def __init__(self, factory: Callable[[K], A], max_size: Optional[int] = None):
         self._factory = factory
         self._store = {}
-        self._read_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._max_size = max_size
 
     def __contains__(self, k: K) -> bool:
         return k in self._store
 
     def __getitem__(self, k: K) -> A:
-        self._read_lock.acquire()
-        try:
+        with self._lock:
             value = self._store.get(k)
+            if isinstance(value, Available):
+                if self._max_size is not None:
+                    # mark as recently used: dicts keep the insertion order
+                    self._store[k] = self._store.pop(k)
+                return value.result
+            producing = value is None
             if value is None:
-                return self._fill_cache(k)
-            elif isinstance(value, InProgress):
+                value = InProgress(threading.Lock())
                 value.lock.acquire()
-                value.lock.release()
-                new_value = self._store.get(k)
-                if not isinstance(new_value, Available):
-                    raise RuntimeError(f"Getting key {k!r} failed :-(")
-                return new_value.result
-            elif isinstance(value, Available):
-                return value.result
-            else:
-                assert False
-        finally:
-            if self._read_lock.locked():
-                self._read_lock.release()
-
-    def _fill_cache(self, k: K) -> A:
-        lock = threading.Lock()
-        self._store[k] = InProgress(lock)
-        if self._read_lock.locked():
-            self._read_lock.release()
-        lock.acquire()
+                self._store[k] = value
+
+        if producing:
+            return self._fill_cache(k, value)
+        # another thread is computing it, wait until it's done
+        with value.lock:
+            pass
+        if value.outcome is None:
+            raise RuntimeError(f"Getting key {k!r} failed :-(")
+        return value.outcome.result
+
+    def _fill_cache(self, k: K, progress: InProgress[A]) -> A:
         try:
             new_value = self._factory(k)
         except:
-            del self._store[k]
-            lock.release()
+            with self._lock:
+                del self._store[k]
+            progress.lock.release()
             raise
-        self._store[k] = Available(new_value)
-        lock.release()
+        progress.outcome = Available(new_value)
+        with self._lock:
+            # it's the most recently used result, however long it took
+            del self._store[k]
+            self._store[k] = progress.outcome
+            if self._max_size is not None:
+                self._evict(keep=k)
+        progress.lock.release()
         return new_value
 
-
-def threaded_cache(factory: Callable[[K], A]) -> Callable[[K], A]:
-    return ThreadedCache(factory).__getitem__
+    def _evict(self, keep: K):
+        """
+        Drop the least recently used results over `max_size`, except `keep`.
+        Must be called with `_lock` held.
+        """
+        excess = len(self._store) - self._max_size  # type: ignore
+        for (key, value) in list(self._store.items()):
+            if excess <= 0:
+                break
+            if key != keep and isinstance(value, Available):
+                del self._store[key]
+                excess -= 1
+
+
+def threaded_cache(factory: Callable[[K], A], max_size: Optional[int] = None) -> Callable[[K], A]:
+    return ThreadedCache(factory, max_size).__getitem__
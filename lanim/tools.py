@@ -0,0 +1,85 @@
+"""
+Checking that the external programs lanim needs are installed.
+
+Programs are checked only when they are about to be used, so rendering a
+scene without LaTeX never looks for TeX. A program is considered working
+after it has been run once; this is remembered per executable path and
+modification time in `~/.cache/lanim/tools.json` (or under
+`$XDG_CACHE_HOME`), so later runs don't have to start it again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+import shutil
+import subprocess
+from threading import Lock
+
+
+__all__ = [
+    "require",
+]
+
+
+_checked: set[str] = set()
+_lock = Lock()
+
+
+def _cache_file() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "lanim" / "tools.json"
+
+
+def _read_cache() -> dict[str, float]:
+    try:
+        return json.loads(_cache_file().read_text("utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache: dict[str, float]):
+    path = _cache_file()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(cache, indent=2), "utf-8")
+    except OSError:
+        pass  # the cache is only an optimization
+
+
+def _is_present(*cmd: str) -> bool:
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        proc.kill()
+    except OSError:
+        return False
+    else:
+        return True
+
+
+def require(command: str, reason: str):
+    """
+    Make sure `command` can be run, raising `RuntimeError` that explains
+    the `reason` it's needed otherwise
+    """
+    with _lock:
+        if command in _checked:
+            return
+        path = shutil.which(command)
+        if path is not None:
+            path = os.path.realpath(path)
+            mtime = os.stat(path).st_mtime
+            cache = _read_cache()
+            if cache.get(path) != mtime:
+                if not _is_present(path, "--help"):
+                    path = None
+                else:
+                    cache[path] = mtime
+                    _write_cache(cache)
+        if path is None:
+            raise RuntimeError(
+                "The `{}` program is not found. It's needed to {}."
+                .format(command, reason)
+            )
+        _checked.add(command)
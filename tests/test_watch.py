@@ -0,0 +1,93 @@
+import os
+import pathlib
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from lanim import standalone
+
+
+SCENE = '''
+from lanim.core import Animation, ease_p
+from lanim.easings import in_out
+from lanim.pil_types import Group, Nil, Rect, Sum
+
+
+def strategy(p, q):
+    return ease_p(lambda t: ("p", p.scaled(1 - t)) if t < 1 else ("q", q), in_out)
+
+
+def projector(t):
+    shape = Sum(("p", Rect({x}, 0, 1, 1)), strategy)
+    faded = Sum(("q", Nil(0, 0)), lambda p, q: lambda t: ("q", q))
+    return Group([shape.moved(t, 0), faded])
+
+
+export = Animation(1.0, projector)
+'''
+
+
+@pytest.fixture
+def scene_module(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = tmp_path / "watched_scene.py"
+
+    def write(x: float):
+        path.write_text(SCENE.format(x=x), "utf-8")
+        # make sure the edit is noticed even within the mtime resolution
+        stat = path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+        sys.modules.pop("watched_scene", None)
+
+    write(0.0)
+    yield write
+    sys.modules.pop("watched_scene", None)
+
+
+def _scenes():
+    animation = standalone._find_animation("watched_scene", "export")
+    return standalone._scene_trees(animation, 10, range(11))
+
+
+def test_unchanged_reload_with_sum_changes_nothing(scene_module):
+    before = _scenes()
+    scene_module(0.0)
+    assert standalone._changed_frames(before, _scenes()) == []
+
+
+def test_edited_scene_changes_every_frame(scene_module):
+    before = _scenes()
+    scene_module(0.5)
+    assert standalone._changed_frames(before, _scenes()) == list(range(11))
+
+
+def test_watch_reports_no_frames_changed(scene_module, monkeypatch, capsys, tmp_path):
+    options = SimpleNamespace(
+        module="watched_scene",
+        export_name="export",
+        range=(0, 99),
+        fps=10,
+        shard=None,
+        frames=None,
+        output=tmp_path / "out.mp4",
+        temp_dir=tmp_path / "frames",
+    )
+    sleeps = 0
+    def sleep(_: float):
+        nonlocal sleeps
+        sleeps += 1
+        if sleeps == 1:
+            scene_module(0.0)  # saved without changes
+        else:
+            raise KeyboardInterrupt
+    def render(*args):
+        raise AssertionError("nothing should be rendered")
+    monkeypatch.setattr(standalone.time, "sleep", sleep)
+    monkeypatch.setattr(standalone, "_render_locally", render)
+    monkeypatch.setattr(standalone, "_encode_videos", render)
+
+    standalone._find_animation("watched_scene", "export")
+    standalone._watch(options, [], _scenes())  # type: ignore
+
+    assert "No frames changed" in capsys.readouterr().out